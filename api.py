@@ -0,0 +1,215 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+from flask import Config
+from sqlalchemy import event, func, select, text, tuple_
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from models import Venue, Artist, Show, VenueStats, ArtistStats
+from pagination import encode_cursor, decode_cursor
+from search import escape_like
+
+
+# ----------------------------------------------------------------------------#
+# App Config.
+# ----------------------------------------------------------------------------#
+def create_api(config='config'):
+    # Read-only JSON API on an asyncpg engine, sharing the models' tables.
+    # Serve it on its own or next to the Flask app (see asgi.py).
+    settings = Config(os.path.dirname(os.path.abspath(__file__)))
+    settings.from_object(config)
+
+    @asynccontextmanager
+    async def lifespan(api):
+        await start(api, settings)
+        yield
+        await api.state.engine.dispose()
+
+    api = Starlette(routes=[
+        Route('/venues', list_venues),
+        Route('/venues/search', search_venues),
+        Route('/venues/{id:int}', show_venue),
+        Route('/artists', list_artists),
+        Route('/artists/search', search_artists),
+        Route('/artists/{id:int}', show_artist),
+        Route('/shows', list_shows),
+    ], lifespan=lifespan)
+
+    return api
+
+
+def async_url(url):
+    return 'postgresql+asyncpg://' + url.split('://', 1)[1]
+
+
+async def start(api, settings):
+    timeout = settings['DB_STATEMENT_TIMEOUT']
+    if settings['DB_PGBOUNCER']:
+        # Same as database.engine_options: PgBouncer owns the pool and the
+        # timeout is set per transaction. asyncpg also prepares every
+        # statement, which transaction pooling cannot route back to the
+        # server connection that prepared it, so its caches are turned off.
+        options = {
+            'poolclass'   : NullPool,
+            'connect_args': {'statement_cache_size': 0, 'prepared_statement_cache_size': 0},
+        }
+    else:
+        options = {
+            'pool_size'    : settings['DB_POOL_SIZE'],
+            'max_overflow' : settings['DB_MAX_OVERFLOW'],
+            'pool_timeout' : settings['DB_POOL_TIMEOUT'],
+            'pool_recycle' : settings['DB_POOL_RECYCLE'],
+            'pool_pre_ping': settings['DB_POOL_PRE_PING'],
+        }
+        if timeout:
+            options['connect_args'] = {'server_settings': {'statement_timeout': str(timeout)}}
+
+    api.state.engine = create_async_engine(async_url(settings['SQLALCHEMY_DATABASE_URI']), **options)
+    if settings['DB_PGBOUNCER'] and timeout:
+        event.listen(api.state.engine.sync_engine, 'begin', lambda conn: conn.execute(
+            text('SET LOCAL statement_timeout = %d' % timeout)))
+    api.state.page_size = settings['SHOWS_PAGE_SIZE']
+
+
+async def fetch(request, query):
+    async with request.app.state.engine.connect() as connection:
+        result = await connection.execute(query)
+        return [dict(row._mapping) for row in result]
+
+
+def jsonable(rows):
+    for row in rows:
+        for key, value in row.items():
+            if isinstance(value, datetime):
+                row[key] = value.isoformat()
+    return rows
+
+
+def page_limit(request):
+    try:
+        limit = int(request.query_params.get('limit', request.app.state.page_size))
+    except ValueError:
+        limit = request.app.state.page_size
+    return max(1, min(limit, 200))
+
+
+# ----------------------------------------------------------------------------#
+# Controllers.
+# ----------------------------------------------------------------------------#
+async def list_entities(request, model):
+    # id ordered pages, resumed with ?after=<last id>
+    limit = page_limit(request)
+    query = select(model.id, model.name, model.city, model.state).order_by(model.id).limit(limit)
+    after = request.query_params.get('after', '')
+    if after.isdigit():
+        query = query.where(model.id > int(after))
+    rows = await fetch(request, query)
+
+    return JSONResponse({
+        'data': rows,
+        'next': rows[-1]['id'] if len(rows) == limit else None
+    })
+
+
+async def search_entities(request, model, stats):
+    # name matches with their number of upcoming shows, like the search pages
+    term = request.query_params.get('q', '')
+    query = select(
+        model.id,
+        model.name,
+        func.coalesce(stats.upcoming_shows_count, 0).label('num_upcoming_shows')
+    ).select_from(model) \
+        .outerjoin(stats, stats.id == model.id) \
+        .where(model.name.ilike('%' + escape_like(term) + '%', escape='\\')) \
+        .order_by(func.similarity(model.name, term).desc(), model.name) \
+        .limit(page_limit(request))
+    rows = await fetch(request, query)
+
+    return JSONResponse({'count': len(rows), 'data': rows})
+
+
+async def show_entity(request, model, columns, other, key, other_key):
+    # One venue or artist with its past and upcoming shows split on one `now`
+    id = request.path_params['id']
+    rows = await fetch(request, select(*columns).where(model.id == id))
+    if not rows:
+        return JSONResponse({'error': 'not found'}, status_code=404)
+
+    shows = await fetch(request, select(
+        Show.start_time,
+        other.id,
+        other.name,
+        other.image_link
+    ).join(other, other_key == other.id).where(key == id).order_by(Show.start_time))
+    now = datetime.now()
+    data = jsonable(rows)[0]
+    data['upcoming_shows'] = jsonable([show for show in shows if show['start_time'] > now])
+    data['past_shows'] = jsonable([show for show in shows if show['start_time'] <= now])
+
+    return JSONResponse(data)
+
+
+async def list_venues(request):
+    return await list_entities(request, Venue)
+
+
+async def list_artists(request):
+    return await list_entities(request, Artist)
+
+
+async def search_venues(request):
+    return await search_entities(request, Venue, VenueStats)
+
+
+async def search_artists(request):
+    return await search_entities(request, Artist, ArtistStats)
+
+
+async def show_venue(request):
+    return await show_entity(request, Venue, Venue.__table__.c, Artist, Show.venue_id, Show.artist_id)
+
+
+async def show_artist(request):
+    return await show_entity(request, Artist, Artist.__table__.c, Venue, Show.artist_id, Show.venue_id)
+
+
+async def list_shows(request):
+    # Shows of one day (?date=YYYY-MM-DD), or from today on, in (start_time, id)
+    # order and resumed with the opaque ?after= cursor
+    try:
+        day = datetime.strptime(request.query_params.get('date', ''), '%Y-%m-%d')
+        start, end = day, day + timedelta(days=1)
+    except ValueError:
+        start, end = datetime.now(), None
+    limit = page_limit(request)
+
+    query = select(
+        Show.id,
+        Show.start_time,
+        Venue.id.label('venue_id'),
+        Venue.name.label('venue_name'),
+        Artist.id.label('artist_id'),
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')
+    ).join(Venue, Show.venue_id == Venue.id) \
+        .join(Artist, Show.artist_id == Artist.id) \
+        .where(Show.start_time >= start) \
+        .order_by(Show.start_time, Show.id) \
+        .limit(limit)
+    if end is not None:
+        query = query.where(Show.start_time < end)
+    after = decode_cursor(request.query_params.get('after'), 2)
+    if after is not None:
+        query = query.where(tuple_(Show.start_time, Show.id) > after)
+    rows = await fetch(request, query)
+    next = encode_cursor([rows[-1]['start_time'], rows[-1]['id']]) if len(rows) == limit else None
+
+    return JSONResponse({'data': jsonable(rows), 'next': next})
@@ -0,0 +1,215 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+from flask import Blueprint, current_app, render_template, request, flash, redirect, url_for, jsonify
+
+from genres import normalize_genre, normalize_genres
+from jobs import enqueue
+from matches import mark_stale
+from models import db, Artist, ArtistStats
+from pagination import decode_cursor
+from queries import artist_list, artist_page, stamp
+from stats import genre_counts
+from services import search, artist_index, page_cache
+from versions import bump_versions, conditional, current_versions
+
+bp = Blueprint('artists', __name__)
+
+
+#  Artists
+#  ----------------------------------------------------------------
+@bp.route('/artists')
+@conditional('Artist')
+def artists():
+    # one page at a time, moved through with the ?after= / ?before= cursors,
+    # of one genre with ?genre=
+    after = decode_cursor(request.args.get('after'), 2)
+    before = decode_cursor(request.args.get('before'), 2)
+    genre = normalize_genre(request.args.get('genre'))
+    return render_template('pages/artists.html',
+                           artists=lambda: artist_list(after, before, current_app.config['ARTISTS_PAGE_SIZE'], genre),
+                           genres=lambda: genre_counts(Artist), genre=genre,
+                           versions=current_versions('Artist'))
+
+
+@bp.route('/artists/search', methods=['GET', 'POST'])
+def search_artists():
+    # search for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
+    # search for "band" should return "The Wild Sax Band".
+    search_term = request.values.get('search_term', '')
+    response = search.search(Artist, ArtistStats, search_term,
+                             after=decode_cursor(request.args.get('after'), 3),
+                             before=decode_cursor(request.args.get('before'), 3),
+                             per_page=current_app.config['SEARCH_PAGE_SIZE'])
+
+    return render_template('pages/search_artists.html', results=response,
+                           search_term=search_term)
+
+
+@bp.route('/artists/typeahead')
+def typeahead_artists():
+    # JSON suggestions for the artist search box, answered from memory
+    return jsonify({
+        'data': artist_index.query(request.args.get('q', ''),
+                                   limit=min(request.args.get('limit', 10, type=int), 50))
+    })
+
+
+@bp.route('/artists/<int:artist_id>', methods=['GET', 'POST'])
+@conditional('artist:{artist_id}', clock=True)
+def show_artist(artist_id):
+    # shows the artist page with the given artist_id
+    # keyed on the page version, so a bump from any process or job retires
+    # the entries of every worker. The data carries that version for the
+    # fragment cache of the template.
+    key = 'artist:%d' % artist_id
+    version = current_versions(key)[key]
+    data = page_cache.get_or_set('%s:%d' % (key, version), lambda: stamp(artist_page(artist_id), version))
+    if not data:
+        flash('An error occurred. Artist id:' + str(artist_id) + ' could not be found.', 'error')
+        return redirect(url_for('artists.artists'))
+
+    return render_template('pages/show_artist.html', artist=data)
+
+
+#  Create Artist
+#  ----------------------------------------------------------------
+@bp.route('/artists/create', methods=['GET'])
+def create_artist_form():
+    from forms import ArtistForm
+
+    form = ArtistForm()
+    return render_template('forms/new_artist.html', form=form)
+
+
+@bp.route('/artists/create', methods=['POST'])
+def create_artist_submission():
+    # called upon submitting the new artist listing form
+    from forms import ArtistForm
+
+    error = False
+    form = ArtistForm()
+    try:
+        genres = normalize_genres(form.genres.data)
+        create_artist = Artist(
+            name=form.name.data,
+            city=form.city.data,
+            state=form.state.data,
+            phone=form.phone.data,
+            genres=genres,
+            facebook_link=form.facebook_link.data,
+            website=form.website.data,
+            image_link=form.image_link.data,
+            seeking_venue=form.seeking_venue.data,
+            seeking_description=form.seeking_description.data
+        )
+        db.session.add(create_artist)
+        db.session.flush()
+        enqueue('genre_stats', genres=genres)
+        mark_stale(artist_ids=[create_artist.id])
+        bump_versions('Artist', 'ArtistNames')
+        db.session.commit()
+        artist_index.add(create_artist.id, create_artist.name)
+    except:
+        error = True
+        db.session.rollback()
+    if error:
+        # on error, flash error message
+        flash('An error occurred. Artist ' + form.name.data + ' could not be listed.', 'error')
+        return render_template('forms/new_artist.html', form=form)
+    else:
+        # on successful db insert, flash success
+        flash('Artist ' + form.name.data + ' was successfully listed!', 'success')
+
+    return redirect(url_for('artists.artists'))
+
+
+#  Update
+#  ----------------------------------------------------------------
+@bp.route('/artists/<int:artist_id>/edit', methods=['GET'])
+def edit_artist(artist_id):
+    from forms import ArtistForm
+
+    artist = Artist.query.get(artist_id)
+    form = ArtistForm(obj=artist)
+    return render_template('forms/edit_artist.html', form=form, artist=artist)
+
+
+@bp.route('/artists/<int:artist_id>/edit', methods=['POST'])
+def edit_artist_submission(artist_id):
+    # artist record with ID <artist_id> using the new attributes
+    from forms import ArtistForm
+
+    error = False
+    form = ArtistForm()
+    try:
+        artist = Artist.query.get(artist_id)
+        genres = set(artist.genres or ())
+        name = artist.name
+        # assign new form values to database
+        artist.name = form.name.data
+        artist.city = form.city.data
+        artist.state = form.state.data
+        artist.phone = form.phone.data
+        artist.genres = normalize_genres(form.genres.data)
+        artist.website = form.website.data
+        artist.facebook_link = form.facebook_link.data
+        artist.image_link = form.image_link.data
+        artist.seeking_venue = form.seeking_venue.data
+        artist.seeking_description = form.seeking_description.data
+        enqueue('genre_stats', genres=sorted(genres | set(artist.genres)))
+        mark_stale(artist_ids=[artist_id])
+
+        # the pages of its venues follow in a job
+        keys = ['artist:%d' % artist_id]
+        if artist.name != name:
+            keys.append('ArtistNames')
+        enqueue('linked_pages', artist_id=artist_id)
+        bump_versions('Artist', *keys)
+        # db.session.update(venue)
+        db.session.commit()
+        artist_index.add(artist_id, form.name.data)
+    except Exception as e:
+        print(f'Error ==> {e}')
+        error = True
+        db.session.rollback()
+    if error:
+        # on error, flash error message
+        flash('An error occurred. Artist ' + str(artist_id) + ' could not be updated.', 'error')
+    else:
+        # on successful db insert, flash success
+        flash('Artist ' + str(artist_id) + ' was successfully updated!', 'success')
+
+    return redirect(url_for('artists.show_artist', artist_id=artist_id))
+
+
+# Not working... Getting 405 method not allowed = Why?
+# -----------------------------------------------------
+# @bp.route('/artist/<artist_id>', methods=['DELETE'])
+# def delete_artist(artist_id):
+#     error = False
+#     response = True
+#     body = []
+#     try:
+#         artist = Artist.query.get(artist_id)
+#         body = {
+#             "id"   : artist.id,
+#             "name" : artist.name
+#         }
+#         db.session.delete(artist)
+#         db.session.commit()
+#     except:
+#         db.session.rollback()
+#     finally:
+#         db.session.close()
+#     if error:
+#         response = False
+#         # on error, flash error message
+#         flash('An error occurred. Artist id:' + str(artist_id) + ' could not be deleted!', 'error')
+#         body['error'] = error
+#     else:
+#         # on successful db delete, flash success
+#         flash('Artist id:' + str(artist_id) + ' was successfully removed!', 'success')
+#         body['response'] = response
+#
+#     return jsonify(body)
@@ -0,0 +1,28 @@
+# ----------------------------------------------------------------------------#
+# ASGI entry point: the async JSON API under /api, the Flask site under /.
+#
+#   uvicorn asgi:app --workers 4
+# ----------------------------------------------------------------------------#
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.routing import Mount
+
+from api import create_api
+from app import create_app
+
+api = create_api()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # mounted apps do not get lifespan events of their own
+    async with api.router.lifespan_context(api):
+        yield
+
+
+app = Starlette(routes=[
+    Mount('/api', app=api),
+    Mount('/', app=WSGIMiddleware(create_app())),
+], lifespan=lifespan)
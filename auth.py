@@ -0,0 +1,22 @@
+import hmac
+from functools import wraps
+
+from flask import abort, current_app, request
+
+
+# ----------------------------------------------------------------------------#
+# Admin endpoints.
+# ----------------------------------------------------------------------------#
+def admin_only(view):
+    # Requires "Authorization: Bearer <ADMIN_TOKEN>". Off while ADMIN_TOKEN
+    # is unset.
+    @wraps(view)
+    def wrapper(**kwargs):
+        token = current_app.config['ADMIN_TOKEN']
+        if not token:
+            abort(404)
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied.encode(), ('Bearer ' + token).encode()):
+            abort(401)
+        return view(**kwargs)
+    return wrapper
@@ -0,0 +1,50 @@
+"""Throughput and tail latency of the sync pages against the async API.
+
+Fires `requests` GETs at each URL from `clients` concurrent threads and
+reports requests per second and p50/p99 latency. Start the stack first:
+
+    uvicorn asgi:app --workers 4
+    python benchmarks/bench_api.py [base_url] [clients] [requests]
+"""
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import urlopen
+
+PATHS = [
+    ('sync  venue page', '/venues/1'),
+    ('async venue json', '/api/venues/1'),
+    ('sync  search', '/venues/search?search_term=the'),
+    ('async search', '/api/venues/search?q=the'),
+    ('sync  shows', '/shows'),
+    ('async shows', '/api/shows'),
+]
+
+
+def timed_get(url):
+    started = time.perf_counter()
+    with urlopen(url) as response:
+        response.read()
+    return time.perf_counter() - started
+
+
+def percentile(timings, fraction):
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))]
+
+
+def main(base_url='http://localhost:8000', clients=32, requests=2000):
+    clients, requests = int(clients), int(requests)
+    print('%d clients, %d requests per url' % (clients, requests))
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        for label, path in PATHS:
+            url = base_url.rstrip('/') + path
+            timed_get(url)
+            started = time.perf_counter()
+            timings = sorted(pool.map(timed_get, [url] * requests))
+            elapsed = time.perf_counter() - started
+            print('  %-18s %8.1f req/s  p50 %6.1f ms  p99 %6.1f ms' % (
+                label, requests / elapsed, percentile(timings, 0.5) * 1000, percentile(timings, 0.99) * 1000))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,49 @@
+"""Micro-benchmark of the `datetime` template filter.
+
+Compares the original filter (string round trip through dateutil, babel
+pattern parsed on every call) with filters.format_datetime and the batch
+filters.format_datetimes over a column of show times.
+
+    python benchmarks/bench_datetime.py [rows] [distinct]
+"""
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from filters import format_datetime, format_datetimes  # noqa: E402
+
+
+def legacy_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format)
+
+
+def main(rows=2000, distinct=500):
+    start = datetime(2020, 1, 1, 20, 0)
+    column = [start + timedelta(hours=i % distinct) for i in range(rows)]
+
+    runs = {
+        'legacy filter': lambda: [legacy_format_datetime(str(value), 'full') for value in column],
+        'filter'       : lambda: [format_datetime(value, 'full') for value in column],
+        'batch'        : lambda: format_datetimes(column, 'full'),
+    }
+    assert runs['legacy filter']() == runs['filter']() == runs['batch']()
+
+    print('%d rows, %d distinct start times' % (rows, distinct))
+    for name, run in runs.items():
+        best = min(timeit.repeat(run, number=1, repeat=5))
+        print('%-14s %8.2f ms  %6.2f us/row' % (name, best * 1000, best * 1e6 / rows))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,291 @@
+"""Drive every route of the app and record how each one performs.
+
+Runs in process through the Flask test client against the configured
+database, normally one filled by generate_data.py. For each route it
+reports requests per second, p50/p95/p99 latency, SQL statements per
+request (streamed bodies included) and the peak RSS of the process so far,
+then writes everything to a JSON file named after the current commit.
+Write routes run last and add rows, so regenerate the data before runs
+that are to be compared. The background jobs a route queues run after its
+timing, in this process, and are counted in its result.
+
+    python benchmarks/generate_data.py medium --truncate
+    python benchmarks/bench_routes.py [--requests N] [--output FILE] [--compare BASELINE.json]
+
+With --compare, routes whose p95 latency grew by more than --tolerance or
+that send more statements than in the baseline are listed and the exit
+status is 1. A missing baseline file is an error (status 2), so the gate
+cannot pass by accident.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import jobs  # noqa: E402
+from app import create_app  # noqa: E402
+from models import db, Venue, Show, VenueStats, ArtistStats  # noqa: E402
+
+ADMIN_TOKEN = 'bench'
+FAR_FUTURE = datetime(2100, 1, 1, 20, 0)
+
+
+def venue_form(i, samples):
+    return {'name': 'Bench Venue %d %s' % (i, samples['run']), 'city': 'Austin', 'state': 'TX',
+            'address': '1 Bench St', 'phone': '555-555-5555', 'genres': ['Jazz', 'Blues'],
+            'facebook_link': '', 'image_link': '', 'website': '', 'seeking_description': ''}
+
+
+def artist_form(i, samples):
+    return {'name': 'Bench Artist %d %s' % (i, samples['run']), 'city': 'Austin', 'state': 'TX',
+            'phone': '555-555-5555', 'genres': ['Jazz'], 'facebook_link': '', 'image_link': '', 'website': '',
+            'seeking_description': ''}
+
+
+def show_form(i, samples):
+    # a fresh slot per request, so none is refused as a double booking
+    start = samples['free_from'] + timedelta(hours=3 * i)
+    return {'venue_id': samples['venue'], 'artist_id': samples['artist'],
+            'start_time': start.strftime('%Y-%m-%d %H:%M:%S'), 'duration': 120}
+
+
+# endpoint -> (method, path, form data). Paths are formatted with the
+# samples: the busiest venue and artist, `new_venue` (one created by this
+# run), `today`, `tomorrow` and `i`, the request number.
+ROUTES = [
+    ('index', 'GET', '/', None),
+    ('venues.venues', 'GET', '/venues', None),
+    ('venues.search_venues', 'GET', '/venues/search?search_term=blue', None),
+    ('venues.typeahead_venues', 'GET', '/venues/typeahead?q=blu', None),
+    ('venues.nearby_venues', 'GET', '/venues/nearby?lat=40.7128&lon=-74.0060&limit=20', None),
+    ('venues.show_venue', 'GET', '/venues/{venue}', None),
+    ('venues.create_venue_form', 'GET', '/venues/create', None),
+    ('venues.edit_venue', 'GET', '/venues/{venue}/edit', None),
+    ('artists.artists', 'GET', '/artists', None),
+    ('artists.search_artists', 'GET', '/artists/search?search_term=blue', None),
+    ('artists.typeahead_artists', 'GET', '/artists/typeahead?q=blu', None),
+    ('artists.show_artist', 'GET', '/artists/{artist}', None),
+    ('artists.create_artist_form', 'GET', '/artists/create', None),
+    ('artists.edit_artist', 'GET', '/artists/{artist}/edit', None),
+    ('shows.shows', 'GET', '/shows', None),
+    ('shows.create_shows', 'GET', '/shows/create', None),
+    ('shows.show_choices', 'GET', '/shows/choices/venues?q=blu', None),
+    ('cache_stats', 'GET', '/admin/cache', None),
+    ('pool_stats', 'GET', '/admin/pool', None),
+    ('query_stats', 'GET', '/admin/queries', None),
+    ('job_stats', 'GET', '/admin/jobs', None),
+    ('metrics', 'GET', '/admin/metrics', None),
+    ('export', 'GET', '/admin/export/shows?start={today}&end={tomorrow}', None),
+    # writes
+    ('venues.create_venue_submission', 'POST', '/venues/create', venue_form),
+    ('venues.edit_venue_submission', 'POST', '/venues/{new_venue}/edit', venue_form),
+    ('artists.create_artist_submission', 'POST', '/artists/create', artist_form),
+    ('artists.edit_artist_submission', 'POST', '/artists/{artist}/edit', artist_form),
+    ('shows.create_show_submission', 'POST', '/shows/create', show_form),
+    ('venues.delete_venue', 'DELETE', '/venues/{new_venue}', None),
+]
+# routes not worth a timing of their own
+SKIPPED = {'static'}
+
+
+# ----------------------------------------------------------------------------#
+# Measuring.
+# ----------------------------------------------------------------------------#
+class StatementCounter(object):
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'after_cursor_execute', self)
+
+    def __call__(self, *args):
+        self.count += 1
+
+
+def percentile(timings, fraction):
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))]
+
+
+def peak_rss_kb():
+    # kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def run_route(client, counter, method, path, data, samples, requests, warmup, new_venues=None):
+    timings = []
+    statements = errors = 0
+    for i in range(-warmup, requests):
+        if new_venues is not None:
+            samples = dict(samples, new_venue=new_venues[i + warmup])
+        url = path.format(i=i, **samples)
+        form = data(i + warmup, samples) if callable(data) else data
+        before = counter.count
+        started = time.perf_counter()
+        response = client.open(url, method=method, data=form,
+                               headers={'Authorization': 'Bearer ' + ADMIN_TOKEN})
+        response.get_data()
+        elapsed = time.perf_counter() - started
+        response.close()
+        if i < 0:
+            continue
+        timings.append(elapsed)
+        statements += counter.count - before
+        errors += response.status_code >= 400
+
+    timings.sort()
+    return {
+        'method'     : method,
+        'path'       : path,
+        'requests'   : requests,
+        'errors'     : errors,
+        'rps'        : round(requests / sum(timings), 1),
+        'p50_ms'     : round(percentile(timings, 0.50) * 1000, 2),
+        'p95_ms'     : round(percentile(timings, 0.95) * 1000, 2),
+        'p99_ms'     : round(percentile(timings, 0.99) * 1000, 2),
+        'statements' : round(statements / float(requests), 1),
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+
+def load_samples(app):
+    # the busiest venue and artist, so detail pages show their worst case
+    with app.app_context():
+        venue = db.session.query(VenueStats.id) \
+            .order_by((VenueStats.upcoming_shows_count + VenueStats.past_shows_count).desc()).limit(1).scalar()
+        artist = db.session.query(ArtistStats.id) \
+            .order_by((ArtistStats.upcoming_shows_count + ArtistStats.past_shows_count).desc()).limit(1).scalar()
+        last = db.session.query(db.func.max(Show.start_time)) \
+            .filter((Show.venue_id == venue) | (Show.artist_id == artist)).scalar()
+        counts = {name: db.session.execute(db.text('SELECT count(*) FROM "%s"' % name)).scalar()
+                  for name in ('Venue', 'Artist', 'Show')}
+    if venue is None or artist is None:
+        sys.exit('no venues or artists, run generate_data.py first')
+    today = datetime.now().date()
+    run = datetime.now().strftime('%Y%m%d%H%M%S')
+    samples = {'venue': venue, 'artist': artist, 'today': today.isoformat(),
+               'tomorrow': (today + timedelta(days=1)).isoformat(), 'run': run,
+               'free_from': max(FAR_FUTURE, (last or FAR_FUTURE) + timedelta(days=1))}
+    return samples, counts
+
+
+def created_venues(app, run):
+    with app.app_context():
+        return [id for id, in db.session.query(Venue.id).filter(Venue.name.like('Bench Venue %% %s' % run))
+                .order_by(Venue.id)]
+
+
+def git_commit():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT).decode().strip()
+        dirty = bool(subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                             cwd=ROOT).strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+    return commit, dirty
+
+
+def run(config, requests, warmup):
+    app = create_app(config)
+    app.config.update(WTF_CSRF_ENABLED=False, ADMIN_TOKEN=ADMIN_TOKEN,
+                      JOBS_WORKERS=0, MATCH_REFRESH_DELAY=0)
+    covered = {endpoint for endpoint, _, _, _ in ROUTES} | SKIPPED
+    missing = sorted(rule.endpoint for rule in app.url_map.iter_rules() if rule.endpoint not in covered)
+    if missing:
+        sys.exit('routes without a benchmark: %s' % ', '.join(missing))
+
+    samples, counts = load_samples(app)
+    with app.app_context():
+        counter = StatementCounter(db.engine)
+    client = app.test_client()
+    routes = {}
+    for endpoint, method, path, data in ROUTES:
+        new_venues = None
+        if '{new_venue}' in path:
+            # edit and delete the venues created above, one per request
+            new_venues = created_venues(app, samples['run'])
+            if len(new_venues) < requests + warmup:
+                sys.exit('%s needs %d venues created by this run' % (endpoint, requests + warmup))
+        result = routes[endpoint] = run_route(client, counter, method, path, data, samples, requests, warmup,
+                                              new_venues)
+        with app.app_context():
+            result['jobs'] = jobs.drain()
+        print('%-36s %8.1f req/s  p50 %7.2f  p95 %7.2f  p99 %7.2f ms  %5.1f stmts  %d errors' % (
+            endpoint, result['rps'], result['p50_ms'], result['p95_ms'], result['p99_ms'], result['statements'],
+            result['errors']), file=sys.stderr)
+
+    commit, dirty = git_commit()
+    return {
+        'commit'     : commit,
+        'dirty'      : dirty,
+        'created'    : datetime.now().isoformat(timespec='seconds'),
+        'python'     : sys.version.split()[0],
+        'config'     : config,
+        'rows'       : counts,
+        'requests'   : requests,
+        'warmup'     : warmup,
+        'peak_rss_kb': peak_rss_kb(),
+        'routes'     : routes,
+    }
+
+
+# ----------------------------------------------------------------------------#
+# Comparing.
+# ----------------------------------------------------------------------------#
+def compare(baseline, current, tolerance):
+    # Lines describing the routes that got slower or chattier than baseline
+    regressions = []
+    for endpoint, result in sorted(current['routes'].items()):
+        before = baseline['routes'].get(endpoint)
+        if before is None:
+            continue
+        if result['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            regressions.append('%s: p95 %.2f ms -> %.2f ms' % (endpoint, before['p95_ms'], result['p95_ms']))
+        if result['statements'] > before['statements']:
+            regressions.append('%s: %.1f -> %.1f statements per request' % (
+                endpoint, before['statements'], result['statements']))
+    if current['peak_rss_kb'] > baseline['peak_rss_kb'] * (1 + tolerance):
+        regressions.append('peak RSS %d kB -> %d kB' % (baseline['peak_rss_kb'], current['peak_rss_kb']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--config', default='config')
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per route')
+    parser.add_argument('--warmup', type=int, default=10, help='untimed requests per route first')
+    parser.add_argument('--output', help='default benchmarks/results/<commit>.json')
+    parser.add_argument('--compare', metavar='BASELINE', help='results of an earlier run')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed p95 and RSS growth, 0.2 = 20%%')
+    args = parser.parse_args()
+    if args.compare and not os.path.exists(args.compare):
+        # a gate without a baseline would always pass
+        print('no baseline at %s, record one with "fab baseline"' % args.compare, file=sys.stderr)
+        return 2
+
+    results = run(args.config, args.requests, args.warmup)
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results', '%s.json' % (results['commit'] or 'latest'))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+    print('results written to %s' % output, file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(json.load(file), results, args.tolerance)
+        for line in regressions:
+            print('REGRESSION %s' % line)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""Cold start cost of one worker.
+
+Reports the import time of the app module (from `python -X importtime`)
+and, for a few fresh interpreters, the time until the app is built and
+until it has answered its first request, like a new gunicorn worker.
+
+    python benchmarks/bench_startup.py [workers] [path] [config]
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = '''
+import json, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app(%r)
+created = time.perf_counter()
+response = app.test_client().get(%r)
+answered = time.perf_counter()
+print(json.dumps({
+    'status': response.status_code,
+    'import': imported - started,
+    'create_app': created - imported,
+    'first_response': answered - created,
+}))
+'''
+
+
+def import_times():
+    # Cumulative microseconds of `import app` and of each module it imports directly
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            cwd=ROOT, stderr=subprocess.PIPE, universal_newlines=True)
+    total, children = 0, []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        if name == ' app':
+            total = int(cumulative)
+        elif name.startswith('   ') and not name.startswith('    '):
+            children.append((int(cumulative), name.strip()))
+    return total, sorted(children, reverse=True)
+
+
+def main(workers=5, path='/', config='config'):
+    total, children = import_times()
+    print('import app: %.1f ms' % (total / 1000.0))
+    for us, name in children[:10]:
+        print('  %8.1f ms  %s' % (us / 1000.0, name))
+
+    print('\nworker start to first response of %s' % path)
+    for _ in range(int(workers)):
+        spawned = time.perf_counter()
+        output = subprocess.check_output([sys.executable, '-c', WORKER % (config, path)], cwd=ROOT)
+        total = time.perf_counter() - spawned
+        run = json.loads(output.decode().strip().splitlines()[-1])
+        print('  %3d  import %6.1f ms  create_app %6.1f ms  first response %6.1f ms  process %6.1f ms' % (
+            run['status'], run['import'] * 1000, run['create_app'] * 1000,
+            run['first_response'] * 1000, total * 1000))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,174 @@
+"""Fill an empty database with synthetic venues, artists and shows.
+
+States and genres are drawn from the form choices with skewed (Zipf like)
+weights, so a few states and genres dominate as in real listings, and
+cities from the bundled gazetteer, which then geocodes the venues. Shows are
+laid out in three hour slots around today, half past and half upcoming,
+with no venue or artist booked twice in a slot. The recommendations are
+computed last. The same seed and scale always give the same data.
+
+    python benchmarks/generate_data.py [small|medium|large] [--seed N] [--truncate] [--config config]
+
+    small:  50 venues,     100 artists,       1,000 shows
+    medium: 2,000 venues,  5,000 artists,   100,000 shows
+    large:  20,000 venues, 50,000 artists, 10,000,000 shows
+"""
+import argparse
+import csv
+import io
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from models import db  # noqa: E402
+
+SCALES = {
+    'small' : (50, 100, 1000),
+    'medium': (2000, 5000, 100000),
+    'large' : (20000, 50000, 10000000),
+}
+WORDS = ['Blue', 'Golden', 'Velvet', 'Electric', 'Silver', 'Midnight', 'Royal', 'Wild', 'Crimson', 'Lucky',
+         'Hollow', 'Neon', 'Rusty', 'Iron', 'Paper', 'Broken', 'Sonic', 'Lonely', 'Grand', 'Little']
+VENUE_NOUNS = ['Hall', 'Room', 'Lounge', 'Theatre', 'Club', 'Ballroom', 'Tavern', 'Garden', 'Stage', 'Cellar']
+ARTIST_NOUNS = ['Band', 'Collective', 'Trio', 'Quartet', 'Sax Band', 'Orchestra', 'Project', 'Kids', 'Sisters',
+                'Brothers']
+SLOT = timedelta(hours=3)
+BATCH = 50000
+
+
+def zipf_weights(count, exponent=1.1):
+    return [1.0 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+class Generator(object):
+
+    def __init__(self, seed, gazetteer):
+        from forms import genres_choices, state_choices
+
+        self.random = random.Random(seed)
+        self.gazetteer = gazetteer
+        self.states = [state for state, _ in state_choices]
+        self.random.shuffle(self.states)
+        self.state_weights = zipf_weights(len(self.states))
+        self.genres = [genre for genre, _ in genres_choices]
+        self.random.shuffle(self.genres)
+        self.genre_weights = zipf_weights(len(self.genres))
+
+    def place(self):
+        state = self.random.choices(self.states, self.state_weights)[0]
+        return self.random.choice(self.gazetteer.cities(state)), state
+
+    def genre_list(self):
+        count = self.random.choice((1, 1, 2, 2, 3))
+        return sorted(set(self.random.choices(self.genres, self.genre_weights, k=count)))
+
+    def name(self, i, nouns):
+        return '%s %s %d' % (self.random.choice(WORDS), self.random.choice(nouns), i)
+
+    def venue(self, i):
+        city, state = self.place()
+        return (self.name(i, VENUE_NOUNS), city, state, '%d Main St' % self.random.randint(1, 9999),
+                '555-%03d-%04d' % (self.random.randint(0, 999), i % 10000), pg_array(self.genre_list()),
+                'https://picsum.photos/seed/v%d/300/300' % i, '', '', self.random.random() < 0.3, '')
+
+    def artist(self, i):
+        city, state = self.place()
+        return (self.name(i, ARTIST_NOUNS), city, state, '555-%03d-%04d' % (self.random.randint(0, 999), i % 10000),
+                pg_array(self.genre_list()), 'https://picsum.photos/seed/a%d/300/300' % i, '', '',
+                self.random.random() < 0.3, '')
+
+    def shows(self, venues, artists, count):
+        # Slot k holds up to min(venues, artists) shows, each venue and each
+        # artist at most once, so the exclusion constraints always hold
+        per_slot = min(venues, artists)
+        venue_order = list(range(1, venues + 1))
+        artist_order = list(range(1, artists + 1))
+        self.random.shuffle(venue_order)
+        self.random.shuffle(artist_order)
+        slots = (count + per_slot - 1) // per_slot
+        first = datetime.now().replace(minute=0, second=0, microsecond=0) - SLOT * (slots // 2)
+        for i in range(count):
+            slot, j = divmod(i, per_slot)
+            yield (venue_order[(j + slot * 7) % venues], artist_order[(j + slot * 13) % artists],
+                   (first + SLOT * slot).isoformat(' '), self.random.choice((60, 90, 120, 150)))
+
+
+def pg_array(values):
+    return '{%s}' % ','.join('"%s"' % value for value in values)
+
+
+def copy_rows(table, columns, rows):
+    cursor = db.session.connection().connection.cursor()
+    written = 0
+    while True:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        batch = 0
+        for row in rows:
+            writer.writerow(row)
+            batch += 1
+            if batch == BATCH:
+                break
+        if not batch:
+            return written
+        buffer.seek(0)
+        cursor.copy_expert('COPY "%s" (%s) FROM STDIN WITH (FORMAT csv)' % (table, ', '.join(columns)), buffer)
+        written += batch
+        print('  %s: %d rows' % (table, written), file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('scale', nargs='?', default='small', choices=sorted(SCALES))
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--truncate', action='store_true', help='empty the tables first')
+    parser.add_argument('--config', default='config')
+    args = parser.parse_args()
+    venues, artists, shows = SCALES[args.scale]
+
+    app = create_app(args.config)
+    with app.app_context():
+        if args.truncate:
+            db.session.execute(db.text('TRUNCATE "Show", "Venue", "Artist", "VenueStats", "ArtistStats", '
+                                       '"GenreStats", "VenueMatch", "ArtistMatch", "StaleMatch", "Job", "Version" '
+                                       'RESTART IDENTITY CASCADE'))
+        elif db.session.execute(db.text('SELECT EXISTS (SELECT 1 FROM "Venue") OR EXISTS (SELECT 1 FROM "Artist")')) \
+                .scalar():
+            sys.exit('the database is not empty, use --truncate')
+
+        started = time.perf_counter()
+        import geo
+        gazetteer = geo.Gazetteer(app.config['GAZETTEER_PATH'])
+        generator = Generator(args.seed, gazetteer)
+        copy_rows('Venue', ['name', 'city', 'state', 'address', 'phone', 'genres', 'image_link', 'facebook_link',
+                            'website', 'seeking_talent', 'seeking_description'],
+                  (generator.venue(i) for i in range(1, venues + 1)))
+        copy_rows('Artist', ['name', 'city', 'state', 'phone', 'genres', 'image_link', 'facebook_link', 'website',
+                             'seeking_venue', 'seeking_description'],
+                  (generator.artist(i) for i in range(1, artists + 1)))
+        copy_rows('Show', ['venue_id', 'artist_id', 'start_time', 'duration'],
+                  generator.shows(venues, artists, shows))
+        db.session.commit()
+
+        import stats
+        from models import Artist, Venue
+        for model in (Venue, Artist):
+            stats.refresh_stats(model)
+        stats.refresh_genre_stats()
+        db.session.commit()
+        geo.geocode_venues(gazetteer, batch_size=BATCH)
+        import matches
+        matches.refresh_matches(everything=True)
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+        print('%s: %d venues, %d artists, %d shows in %.1f s' % (
+            args.scale, venues, artists, shows, time.perf_counter() - started), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+
+# ----------------------------------------------------------------------------#
+# Page data caches.
+# ----------------------------------------------------------------------------#
+class MemoryCache(object):
+    # In-process LRU cache with a per-entry time to live
+
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self.entries[key]
+                self.stats['misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def get_or_set(self, key, builder):
+        # Read-through: build and store the value on a miss. None is not
+        # cached, so missing entities are looked up again next time.
+        value = self.get(key)
+        if value is None:
+            value = builder()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    def info(self):
+        return dict(self.stats, entries=len(self.entries))
+
+
+class RedisCache(MemoryCache):
+    # Cache shared by all workers through a Redis compatible server. Values
+    # are pickled, expiry and eviction are left to the server.
+
+    def __init__(self, url, ttl=300, prefix='fyyur:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        return pickle.loads(value)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=self.ttl)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def info(self):
+        # evictions are counted by the server for the whole keyspace
+        evictions = self.client.info('stats').get('evicted_keys', 0)
+        return dict(self.stats, evictions=evictions, entries=self.client.dbsize())
+
+
+def cache_backend(config):
+    # Redis when CACHE_REDIS_URL is set, the in-process LRU otherwise
+    if config.get('CACHE_REDIS_URL'):
+        return RedisCache(config['CACHE_REDIS_URL'], ttl=config['CACHE_TTL'])
+
+    return MemoryCache(max_entries=config['CACHE_MAX_ENTRIES'], ttl=config['CACHE_TTL'])
+
+
+# ----------------------------------------------------------------------------#
+# Template fragments.
+# ----------------------------------------------------------------------------#
+class FragmentCacheExtension(Extension):
+    # {% cache 'venues', versions.Venue %} ... {% endcache %}
+    #
+    # Renders the body once per distinct key and serves it from
+    # `environment.fragment_cache` afterwards. Keys should carry the version
+    # of the data they render, stale fragments then simply age out. Caching
+    # is off while fragment_cache is None.
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super(FragmentCacheExtension, self).__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+
+        return nodes.CallBlock(self.call_method('_render', [nodes.List(key)]), [], [], body) \
+            .set_lineno(lineno)
+
+    def _render(self, key, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+
+        return cache.get_or_set('fragment:' + ':'.join(str(part) for part in key), caller)
@@ -0,0 +1,112 @@
+import threading
+import time
+
+from flask import has_request_context
+from sqlalchemy import event, text
+from sqlalchemy.pool import NullPool, Pool, QueuePool
+
+from models import db
+
+
+# ----------------------------------------------------------------------------#
+# Connection pool.
+# ----------------------------------------------------------------------------#
+class PoolStats(object):
+    # Process wide pool gauges and checkout wait times
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_use = 0
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def waited(self, seconds):
+        with self.lock:
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def info(self):
+        with self.lock:
+            return {
+                'in_use'          : self.in_use,
+                'checkouts'       : self.checkouts,
+                'wait_seconds_sum': round(self.wait_total, 6),
+                'wait_seconds_max': round(self.wait_max, 6),
+            }
+
+
+stats = PoolStats()
+
+
+class TimedQueuePool(QueuePool):
+    # QueuePool recording how long each checkout waited for a connection
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super(TimedQueuePool, self)._do_get()
+        finally:
+            stats.waited(time.perf_counter() - started)
+
+
+@event.listens_for(Pool, 'checkout')
+def on_checkout(dbapi_connection, connection_record, connection_proxy):
+    with stats.lock:
+        stats.in_use += 1
+
+
+@event.listens_for(Pool, 'checkin')
+def on_checkin(dbapi_connection, connection_record):
+    with stats.lock:
+        stats.in_use -= 1
+
+
+def engine_options(config):
+    # SQLALCHEMY_ENGINE_OPTIONS built from the DB_* settings
+    if config['DB_PGBOUNCER']:
+        # PgBouncer (transaction pooling) owns the pool: hand connections back
+        # after each use. psycopg2 sends plain statements, no server side
+        # prepared statements are involved.
+        return {'poolclass': NullPool}
+
+    return {
+        'poolclass'    : TimedQueuePool,
+        'pool_size'    : config['DB_POOL_SIZE'],
+        'max_overflow' : config['DB_MAX_OVERFLOW'],
+        'pool_timeout' : config['DB_POOL_TIMEOUT'],
+        'pool_recycle' : config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+
+
+def statement_timeout(timeout):
+    # 'begin' listener bounding the statements of web requests. It is set per
+    # transaction, which also works through PgBouncer (startup parameters are
+    # not forwarded) and leaves CLI commands, job workers and the benchmark
+    # scripts, which run outside a request, without a limit.
+    def begin(conn):
+        if has_request_context():
+            conn.execute(text('SET LOCAL statement_timeout = %d' % timeout))
+    return begin
+
+
+def init_app(app):
+    # Bind the models to the app. Flask-SQLAlchemy scopes db.session to the
+    # app context and removes it on teardown, so every request gets its own
+    # session and hands its connection back to the pool when it ends.
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    db.init_app(app)
+    if app.config['DB_STATEMENT_TIMEOUT']:
+        with app.app_context():
+            event.listen(db.engine, 'begin', statement_timeout(app.config['DB_STATEMENT_TIMEOUT']))
+
+
+def pool_info():
+    info = stats.info()
+    pool = db.engine.pool
+    if isinstance(pool, QueuePool):
+        info.update(size=pool.size(), checked_in=pool.checkedin(), overflow=pool.overflow())
+
+    return info
@@ -0,0 +1,238 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from itertools import islice
+
+import click
+from flask import Response, abort, request, stream_with_context
+from flask.cli import AppGroup
+
+from auth import admin_only
+from models import db, Venue, Artist, Show
+
+cli = AppGroup('export', help='Dump venues, artists or shows to CSV, JSONL, Parquet or Arrow.')
+
+FORMATS = {
+    'csv'    : 'text/csv',
+    'jsonl'  : 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow'  : 'application/vnd.apache.arrow.stream',
+}
+COMPRESSIONS = {
+    'gzip': ('.gz', 'application/gzip'),
+    'zstd': ('.zst', 'application/zstd'),
+}
+BATCH_SIZE = 5000
+
+
+# ----------------------------------------------------------------------------#
+# Queries.
+# ----------------------------------------------------------------------------#
+def export_query(kind, city=None, state=None, start=None, end=None):
+    # Rows of one table in id order with the filters applied in SQL. Shows
+    # are filtered on their venue's city/state and on start_time.
+    if kind == 'shows':
+        query = db.session.query(*export_columns(kind)).order_by(Show.id)
+        # city/state of the venue
+        model = Venue
+        if city or state:
+            query = query.join(Venue, Show.venue_id == Venue.id)
+        if start:
+            query = query.filter(Show.start_time >= start)
+        if end:
+            query = query.filter(Show.start_time < end)
+    else:
+        model = Venue if kind == 'venues' else Artist
+        query = db.session.query(*export_columns(kind)).order_by(model.id)
+    if city:
+        query = query.filter(model.city == city)
+    if state:
+        query = query.filter(model.state == state)
+
+    return query
+
+
+def export_columns(kind):
+    # stored columns only, generated ones (Show.during) follow from them
+    model = {'venues': Venue, 'artists': Artist, 'shows': Show}[kind]
+    return [column for column in model.__table__.columns if column.computed is None]
+
+
+def batches(query, size=BATCH_SIZE):
+    # Lists of rows fetched through a server side cursor, so memory stays
+    # flat however large the table is
+    rows = iter(query.yield_per(size))
+    batch = list(islice(rows, size))
+    while batch:
+        yield batch
+        batch = list(islice(rows, size))
+
+
+# ----------------------------------------------------------------------------#
+# Writers.
+# ----------------------------------------------------------------------------#
+def write_csv(columns, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.name for column in columns])
+    for batch in batches:
+        writer.writerows(
+            [','.join(value) if isinstance(value, list) else value for value in row] for row in batch)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def write_jsonl(columns, batches):
+    columns = [column.name for column in columns]
+    for batch in batches:
+        yield ''.join(json.dumps(dict(zip(columns, row)), default=json_default) + '\n' for row in batch) \
+            .encode('utf-8')
+
+
+def json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(repr(value))
+
+
+class ChunkSink(io.RawIOBase):
+    # Write-only file collecting what pyarrow writes, drained after each batch
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+
+def write_arrow_table(columns, batches, format, compression=None):
+    # Parquet (one row group per batch, compressed by column with `compression`)
+    # or an Arrow IPC stream. Needs pyarrow.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(column.name, arrow_type(pa, column.type)) for column in columns])
+    sink = ChunkSink()
+    if format == 'parquet':
+        writer = pq.ParquetWriter(sink, schema, compression=compression or 'snappy')
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    for batch in batches:
+        writer.write_table(pa.Table.from_pydict(
+            {column.name: [row[i] for row in batch] for i, column in enumerate(columns)}, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def arrow_type(pa, type):
+    # The Arrow type of a column, so that every batch shares one schema
+    if isinstance(type, db.ARRAY):
+        return pa.list_(arrow_type(pa, type.item_type))
+    if isinstance(type, db.Boolean):
+        return pa.bool_()
+    if isinstance(type, db.Integer):
+        return pa.int64()
+    if isinstance(type, db.Float):
+        return pa.float64()
+    if isinstance(type, db.DateTime):
+        return pa.timestamp('us')
+    if isinstance(type, db.Date):
+        return pa.date32()
+    return pa.string()
+
+
+def compress(chunks, compression):
+    # gzip (zlib) or zstd (zstandard) over a stream of byte chunks
+    if compression == 'gzip':
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    else:
+        import zstandard
+        compressor = zstandard.ZstdCompressor().compressobj()
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(kind, format, compression=None, **filters):
+    # The whole export as a generator of byte chunks
+    columns = export_columns(kind)
+    rows = batches(export_query(kind, **filters))
+    if format in ('parquet', 'arrow'):
+        # columnar formats compress internally, column by column
+        return write_arrow_table(columns, rows, format, compression)
+    chunks = write_csv(columns, rows) if format == 'csv' else write_jsonl(columns, rows)
+
+    return compress(chunks, compression) if compression else chunks
+
+
+def export_filename(kind, format, compression=None):
+    name = '%s.%s' % (kind, format)
+    if compression and format not in ('parquet', 'arrow'):
+        name += COMPRESSIONS[compression][0]
+    return name
+
+
+# ----------------------------------------------------------------------------#
+# Endpoint.
+# ----------------------------------------------------------------------------#
+@admin_only
+def export_view(kind):
+    # GET /admin/export/<kind>?format=&compression=&city=&state=&start=&end=
+    # with "Authorization: Bearer <ADMIN_TOKEN>"
+    format = request.args.get('format', 'csv')
+    compression = request.args.get('compression') or None
+    if kind not in ('venues', 'artists', 'shows') or format not in FORMATS or \
+            (compression is not None and compression not in COMPRESSIONS):
+        abort(400)
+    try:
+        start = parse_date(request.args.get('start'))
+        end = parse_date(request.args.get('end'))
+    except ValueError:
+        abort(400)
+
+    chunks = export_stream(kind, format, compression, city=request.args.get('city'),
+                           state=request.args.get('state'), start=start, end=end)
+    mimetype = FORMATS[format]
+    if compression and format not in ('parquet', 'arrow'):
+        mimetype = COMPRESSIONS[compression][1]
+    filename = export_filename(kind, format, compression)
+
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={'Content-Disposition': 'attachment; filename=%s' % filename})
+
+
+def parse_date(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+# ----------------------------------------------------------------------------#
+# Command.
+# ----------------------------------------------------------------------------#
+@cli.command('dump', help='Write KIND (venues, artists or shows) to OUTPUT, "-" for stdout.')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('output', type=click.File('wb'), default='-')
+@click.option('--format', 'format', type=click.Choice(sorted(FORMATS)), default='csv', show_default=True)
+@click.option('--compression', type=click.Choice(sorted(COMPRESSIONS)))
+@click.option('--city')
+@click.option('--state')
+@click.option('--start', type=click.DateTime(), help='Shows starting at or after this time.')
+@click.option('--end', type=click.DateTime(), help='Shows starting before this time.')
+def dump(kind, output, format, compression, city, state, start, end):
+    for chunk in export_stream(kind, format, compression, city=city, state=state, start=start, end=end):
+        output.write(chunk)
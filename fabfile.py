@@ -5,14 +5,22 @@ from fabric.contrib.console import confirm
 
 
 def test():
+    # query plans (on the database of TEST_DATABASE_URL), then every route
+    # against the recorded baseline
     with settings(warn_only=True):
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            "python -m pytest -q tests && "
+            "python benchmarks/bench_routes.py --compare benchmarks/results/baseline.json", capture=True
         )
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
 
+def baseline():
+    # record the current numbers as the ones test() compares against
+    local("python benchmarks/bench_routes.py --output benchmarks/results/baseline.json")
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
@@ -39,8 +47,9 @@ def heroku():
 
 
 def heroku_test():
+    # the route benchmark of test(), on the deployed app
     local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
+        "heroku run python benchmarks/bench_routes.py --compare benchmarks/results/baseline.json"
     )
 
 
@@ -0,0 +1,60 @@
+from datetime import datetime, timezone
+from functools import lru_cache
+
+# ----------------------------------------------------------------------------#
+# Date formatting.
+# ----------------------------------------------------------------------------#
+# Named formats accepted by the `datetime` template filter, anything else is
+# used as a babel pattern as is.
+FORMATS = {
+    'full'  : "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=64)
+def compiled_pattern(format, locale):
+    # Parse the babel pattern and locale once per (format, locale)
+    import babel.dates
+
+    return babel.dates.parse_pattern(FORMATS.get(format, format)), babel.Locale.parse(locale)
+
+
+@lru_cache(maxsize=4096)
+def _format(value, format, locale):
+    pattern, locale = compiled_pattern(format, locale)
+    if value.tzinfo is None:
+        # babel reads naive datetimes as UTC
+        value = value.replace(tzinfo=timezone.utc)
+    return pattern.apply(value, locale)
+
+
+def to_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        import dateutil.parser
+        return dateutil.parser.parse(str(value))
+
+
+def format_datetime(value, format='medium', locale=None):
+    # Template filter: format a datetime (or a date string) with a named
+    # format or a babel pattern. Recently formatted values are memoized.
+    import babel.dates
+
+    return _format(to_datetime(value), format, locale or babel.dates.LC_TIME)
+
+
+def format_datetimes(values, format='medium', locale=None):
+    # Format a whole column of datetimes at once, each distinct value once
+    import babel.dates
+
+    locale = locale or babel.dates.LC_TIME
+    formatted = {}
+    for value in values:
+        if value not in formatted:
+            formatted[value] = _format(to_datetime(value), format, locale)
+
+    return [formatted[value] for value in values]
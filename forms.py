@@ -1,7 +1,10 @@
 from datetime import datetime
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL, Length
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField
+from wtforms.validators import DataRequired, AnyOf, URL, Length, NumberRange, Optional, ValidationError
+
+from genres import GENRES
+from services import venue_choices, artist_choices
 
 state_choices = [
     ('AL', 'AL'),
@@ -57,42 +60,39 @@ state_choices = [
     ('WY', 'WY'),
 ]
 
-genres_choices = [
-    ('Alternative', 'Alternative'),
-    ('Blues', 'Blues'),
-    ('Classical', 'Classical'),
-    ('Country', 'Country'),
-    ('Electronic', 'Electronic'),
-    ('Folk', 'Folk'),
-    ('Funk', 'Funk'),
-    ('Hip-Hop', 'Hip-Hop'),
-    ('Heavy Metal', 'Heavy Metal'),
-    ('Instrumental', 'Instrumental'),
-    ('Jazz', 'Jazz'),
-    ('Musical Theatre', 'Musical Theatre'),
-    ('Pop', 'Pop'),
-    ('Punk', 'Punk'),
-    ('R&B', 'R&B'),
-    ('Reggae', 'Reggae'),
-    ('Rock n Roll', 'Rock n Roll'),
-    ('Soul', 'Soul'),
-    ('Swing', 'Swing'),
-    ('Other', 'Other'),
-]
+genres_choices = [(genre, genre) for genre in GENRES]
+
+
+class CachedChoice(object):
+    # Check a select's id against a ChoiceCache rather than its choices, which
+    # only hold the selected option: the rest are looked up remotely
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def __call__(self, form, field):
+        if field.data not in self.cache:
+            raise ValidationError('Not a valid choice.')
 
 
 class ShowForm(Form):
     artist_id = SelectField(
-        'artist_id'
+        'artist_id', coerce=int, choices=[], validate_choice=False,
+        validators=[DataRequired(), CachedChoice(artist_choices)]
     )
     venue_id = SelectField(
-        'venue_id'
+        'venue_id', coerce=int, choices=[], validate_choice=False,
+        validators=[DataRequired(), CachedChoice(venue_choices)]
     )
     start_time = DateTimeField(
         'start_time',
         validators=[DataRequired()],
         default=datetime.today()
     )
+    duration = IntegerField(
+        'duration', validators=[DataRequired(), NumberRange(min=1, max=24 * 60)],
+        default=120
+    )
 
 
 class VenueForm(Form):
@@ -103,33 +103,33 @@ class VenueForm(Form):
         'city', validators=[DataRequired()]
     )
     state = SelectField(
-        'state', validators=[DataRequired(), AnyOf(state_choices)],
+        'state', validators=[DataRequired(), AnyOf([state for state, _ in state_choices])],
         choices=state_choices
     )
     address = StringField(
         'address', validators=[DataRequired()]
     )
     phone = StringField(
-        'phone', validators=[Length(max=20)]
+        'phone', validators=[Optional(), Length(max=12)]
     )
     website = StringField(
-        'website', validators=[URL()]
+        'website', validators=[Optional(), URL()]
     )
     image_link = StringField(
-        'image_link', validators=[URL()]
+        'image_link', validators=[Optional(), URL()]
     )
     seeking_talent = BooleanField(
         'seeking_talent'
     )
     seeking_description = StringField(
-        'seeking_description', validators=[Length(max=500)]
+        'seeking_description', validators=[Optional(), Length(max=500)]
     )
     genres = SelectMultipleField(
-        'genres', validators=[DataRequired(), AnyOf(genres_choices)],
+        'genres', validators=[DataRequired()],
         choices=genres_choices
     )
     facebook_link = StringField(
-        'facebook_link', validators=[URL()]
+        'facebook_link', validators=[Optional(), URL()]
     )
 
 
@@ -141,28 +141,28 @@ class ArtistForm(Form):
         'city', validators=[DataRequired()]
     )
     state = SelectField(
-        'state', validators=[DataRequired(), AnyOf(state_choices)],
+        'state', validators=[DataRequired(), AnyOf([state for state, _ in state_choices])],
         choices=state_choices
     )
     phone = StringField(
-        'phone', validators=[Length(max=20)]
+        'phone', validators=[Optional(), Length(max=12)]
     )
     image_link = StringField(
-        'image_link', validators=[URL()]
+        'image_link', validators=[Optional(), URL()]
     )
     genres = SelectMultipleField(
-        'genres', validators=[DataRequired(), AnyOf(genres_choices)],
+        'genres', validators=[DataRequired()],
         choices=genres_choices
     )
     facebook_link = StringField(
-        'facebook_link', validators=[URL()]
+        'facebook_link', validators=[Optional(), URL()]
     )
     website = StringField(
-        'website', validators=[URL()]
+        'website', validators=[Optional(), URL()]
     )
     seeking_venue = BooleanField(
         'seeking_venue'
     )
     seeking_description = StringField(
-        'seeking_description', validators=[Length(max=500)]
+        'seeking_description', validators=[Optional(), Length(max=500)]
     )
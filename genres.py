@@ -0,0 +1,50 @@
+from sqlalchemy.dialects.postgresql import array
+
+# The genres offered by the forms, in the order they are listed
+GENRES = [
+    'Alternative',
+    'Blues',
+    'Classical',
+    'Country',
+    'Electronic',
+    'Folk',
+    'Funk',
+    'Hip-Hop',
+    'Heavy Metal',
+    'Instrumental',
+    'Jazz',
+    'Musical Theatre',
+    'Pop',
+    'Punk',
+    'R&B',
+    'Reggae',
+    'Rock n Roll',
+    'Soul',
+    'Swing',
+    'Other',
+]
+POSITIONS = {genre.lower(): (position, genre) for position, genre in enumerate(GENRES)}
+
+
+def normalize_genres(values):
+    # Genres as stored: known names spelled as in GENRES, unknown ones
+    # trimmed, "Jazz,Blues" split, no duplicates, in GENRES order then by name
+    names = {}
+    for value in values or ():
+        for part in value.split(','):
+            part = part.strip(' {}"')
+            if part:
+                position, name = POSITIONS.get(part.lower(), (len(GENRES), part))
+                names.setdefault(name, position)
+    return [name for name, _ in sorted(names.items(), key=lambda item: (item[1], item[0]))]
+
+
+def normalize_genre(value):
+    # One ?genre= value, or None when blank
+    genres = normalize_genres([value]) if value else []
+    return genres[0] if genres else None
+
+
+def has_genre(model, genre):
+    # genres @> ARRAY[genre], answered from the GIN index on the column
+    return model.genres.op('@>')(array([genre]))
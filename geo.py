@@ -0,0 +1,325 @@
+import csv
+import math
+import threading
+from datetime import datetime
+from itertools import groupby
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from models import db, Venue, Artist, Show
+from versions import bump_versions, current_versions
+
+cli = AppGroup('geo', help='Geocode venues from the bundled gazetteer.')
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.195
+
+
+# ----------------------------------------------------------------------------#
+# Geocoding.
+# ----------------------------------------------------------------------------#
+class Gazetteer(object):
+    # (city, state) -> (latitude, longitude) from a local CSV file with
+    # city, state, latitude and longitude columns. Rows without a city hold
+    # the centre of their state. Lookups ignore case and surrounding spaces.
+
+    def __init__(self, path):
+        self.places = {}
+        self.names = {}
+        with open(path, newline='', encoding='utf-8') as file:
+            for row in csv.DictReader(file):
+                key = place_key(row['city'], row['state'])
+                self.places[key] = (float(row['latitude']), float(row['longitude']))
+                self.names[key] = row['city']
+
+    def locate(self, city, state, state_fallback=False):
+        location = self.places.get(place_key(city, state))
+        if location is None and state_fallback:
+            location = self.places.get(place_key('', state))
+        return location
+
+    def cities(self, state):
+        # the cities listed for a state, as spelled in the file
+        return sorted(self.names[key] for key in self.places if key[0] and key[1] == state.lower())
+
+
+def place_key(city, state):
+    return (city or '').strip().lower(), (state or '').strip().lower()
+
+
+def geocode_venues(gazetteer, everything=False, state_fallback=False, batch_size=1000):
+    # Fill latitude/longitude of the venues that have none (every venue with
+    # `everything`), committing a batch at a time. Returns the numbers of
+    # venues located and of venues left without a match.
+    located = missed = 0
+    last_id = 0
+    while True:
+        query = db.session.query(Venue.id, Venue.city, Venue.state).filter(Venue.id > last_id)
+        if not everything:
+            query = query.filter(Venue.latitude.is_(None))
+        rows = query.order_by(Venue.id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        updates = []
+        for id, city, state in rows:
+            location = gazetteer.locate(city, state, state_fallback)
+            if location is None:
+                missed += 1
+            else:
+                updates.append({'id': id, 'latitude': location[0], 'longitude': location[1]})
+        if updates:
+            db.session.execute(db.update(Venue), updates)
+            located += len(updates)
+            bump_versions('Venue')
+        db.session.commit()
+
+    return located, missed
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_boxes(latitude, longitude, radius_km):
+    # [(south, west, north, east)] covering a circle: one box, two when it
+    # crosses the antimeridian, and every longitude when it reaches a pole
+    angle = radius_km / EARTH_RADIUS_KM
+    dlat = math.degrees(angle)
+    south, north = max(-90.0, latitude - dlat), min(90.0, latitude + dlat)
+    cos_lat = math.cos(math.radians(latitude))
+    if south <= -90.0 or north >= 90.0 or math.sin(angle) >= cos_lat:
+        return [(south, -180.0, north, 180.0)]
+    # widest longitude the circle reaches, at a latitude nearer the pole
+    dlon = math.degrees(math.asin(math.sin(angle) / cos_lat))
+    west, east = longitude - dlon, longitude + dlon
+    if west < -180.0:
+        return [(south, west + 360.0, north, 180.0), (south, -180.0, north, east)]
+    if east > 180.0:
+        return [(south, west, north, 180.0), (south, -180.0, north, east - 360.0)]
+    return [(south, west, north, east)]
+
+
+# ----------------------------------------------------------------------------#
+# Nearby backends.
+# ----------------------------------------------------------------------------#
+class GistNearby(object):
+    # PostgreSQL: candidates come from the GiST index on point(longitude,
+    # latitude) by box containment within a radius, then are ranked by
+    # great-circle distance. Each venue's next upcoming shows come back in the
+    # same statement through a LATERAL join, one row per show.
+    #
+    # The nearest N without a radius first take N venues in KNN (<->) order.
+    # That order is planar, so it can miss the true nearest at high latitudes
+    # or across the antimeridian, but the farthest of those N bounds a circle
+    # holding at least N venues, which the radius search then ranks exactly.
+
+    def __init__(self, db, shows=3):
+        self.db = db
+        self.shows = shows
+
+    def distance(self, latitude, longitude):
+        # great-circle distance in km from Venue to the point, in SQL
+        func = self.db.func
+        dlat = func.radians(Venue.latitude - latitude)
+        dlon = func.radians(Venue.longitude - longitude)
+        a = func.power(func.sin(dlat * 0.5), 2) + \
+            math.cos(math.radians(latitude)) * func.cos(func.radians(Venue.latitude)) * \
+            func.power(func.sin(dlon * 0.5), 2)
+        return 2 * EARTH_RADIUS_KM * func.asin(func.least(1.0, func.sqrt(a)))
+
+    def covering_radius(self, latitude, longitude, limit):
+        # Great-circle distance in km within which at least `limit` venues
+        # lie, or None when there are fewer venues than that
+        db = self.db
+        location = db.func.point(Venue.longitude, Venue.latitude)
+        distances = sorted(distance for distance, in db.session.query(self.distance(latitude, longitude))
+                           .filter(Venue.latitude.isnot(None))
+                           .order_by(location.op('<->')(db.func.point(longitude, latitude)))
+                           .limit(limit))
+        return distances[-1] if len(distances) == limit else None
+
+    def nearby(self, latitude, longitude, radius_km=None, limit=20, now=None):
+        db = self.db
+        if radius_km is None:
+            radius_km = self.covering_radius(latitude, longitude, limit)
+        location = db.func.point(Venue.longitude, Venue.latitude)
+        distance = self.distance(latitude, longitude).label('distance')
+        venues = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state, distance) \
+            .filter(Venue.latitude.isnot(None))
+        if radius_km is not None:
+            venues = venues.filter(db.or_(*[
+                location.op('<@')(db.func.box(db.func.point(west, south), db.func.point(east, north)))
+                for south, west, north, east in bounding_boxes(latitude, longitude, radius_km)
+            ]))
+        venues = venues.subquery()
+
+        ranked = db.session.query(venues)
+        if radius_km is not None:
+            ranked = ranked.filter(venues.c.distance <= radius_km)
+        ranked = ranked.order_by(venues.c.distance, venues.c.id).limit(limit).subquery()
+
+        upcoming = db.session.query(Show.start_time, Artist.id.label('artist_id'),
+                                    Artist.name.label('artist_name')) \
+            .join(Artist, Show.artist_id == Artist.id) \
+            .filter(Show.venue_id == ranked.c.id, Show.start_time > (now or datetime.now())) \
+            .order_by(Show.start_time) \
+            .limit(self.shows) \
+            .subquery() \
+            .lateral()
+        rows = db.session.query(ranked, upcoming.c.start_time, upcoming.c.artist_id, upcoming.c.artist_name) \
+            .outerjoin(upcoming, db.true()) \
+            .order_by(ranked.c.distance, ranked.c.id, upcoming.c.start_time)
+
+        results = []
+        for _, venue_rows in groupby(rows, key=lambda row: row.id):
+            venue_rows = list(venue_rows)
+            results.append(venue_result(venue_rows[0], [{
+                'artist_id'  : row.artist_id,
+                'artist_name': row.artist_name,
+                'start_time' : row.start_time
+            } for row in venue_rows if row.start_time is not None]))
+        return results
+
+
+class GridNearby(object):
+    # In-process fallback for databases without GiST: venue locations in a
+    # grid of `cell_degrees` cells, searched ring by ring outwards from the
+    # origin cell. The grid reloads when the Venue version moves. Upcoming
+    # shows of the venues found are read in one more statement.
+
+    def __init__(self, db, shows=3, cell_degrees=0.5, version=None):
+        self.db = db
+        self.shows = shows
+        self.cell = cell_degrees
+        self.version = version or (lambda: current_versions('Venue')['Venue'])
+        self.loaded = None
+        self.lock = threading.Lock()
+        self.cells = {}
+
+    def load(self, version):
+        cells = {}
+        rows = self.db.session.query(Venue.id, Venue.name, Venue.city, Venue.state, Venue.latitude,
+                                     Venue.longitude).filter(Venue.latitude.isnot(None))
+        for row in rows:
+            cells.setdefault(self.cell_of(row.latitude, row.longitude), []).append(tuple(row))
+        self.cells = cells
+        self.loaded = version
+
+    def cell_of(self, latitude, longitude):
+        return int(math.floor(latitude / self.cell)), int(math.floor(longitude / self.cell))
+
+    def nearby(self, latitude, longitude, radius_km=None, limit=20, now=None):
+        version = self.version()
+        with self.lock:
+            if self.loaded != version:
+                self.load(version)
+            cells = self.cells
+        total = sum(len(venues) for venues in cells.values())
+        found = []
+        row, column = self.cell_of(latitude, longitude)
+        max_ring = int(360 / self.cell)
+        ring = 0
+        while ring <= max_ring:
+            for cell in ring_cells(row, column, ring):
+                for id, name, city, state, venue_latitude, venue_longitude in cells.get(cell, ()):
+                    distance = haversine_km(latitude, longitude, venue_latitude, venue_longitude)
+                    if radius_km is None or distance <= radius_km:
+                        found.append((distance, id, name, city, state))
+            found.sort()
+            # venues outside the rings searched so far are at least `ring`
+            # cells away, east-west cells being narrowest at the highest
+            # latitude they reach
+            reach = min(89.9, abs(latitude) + (ring + 1) * self.cell)
+            bound = ring * self.cell * KM_PER_DEGREE * math.cos(math.radians(reach))
+            if radius_km is not None:
+                if bound > radius_km:
+                    break
+            elif len(found) >= min(limit, total) and (len(found) == total or found[limit - 1][0] <= bound):
+                break
+            ring += 1
+        found = found[:limit]
+
+        shows = {}
+        if found:
+            upcoming = self.db.session.query(Show.venue_id, Show.start_time, Artist.id, Artist.name) \
+                .join(Artist, Show.artist_id == Artist.id) \
+                .filter(Show.venue_id.in_([id for _, id, _, _, _ in found]),
+                        Show.start_time > (now or datetime.now())) \
+                .order_by(Show.venue_id, Show.start_time)
+            for venue_id, start_time, artist_id, artist_name in upcoming:
+                venue_shows = shows.setdefault(venue_id, [])
+                if len(venue_shows) < self.shows:
+                    venue_shows.append({
+                        'artist_id'  : artist_id,
+                        'artist_name': artist_name,
+                        'start_time' : start_time
+                    })
+
+        return [venue_result(VenueRow(id, name, city, state, distance), shows.get(id, []))
+                for distance, id, name, city, state in found]
+
+
+class VenueRow(object):
+    __slots__ = ('id', 'name', 'city', 'state', 'distance')
+
+    def __init__(self, id, name, city, state, distance):
+        self.id = id
+        self.name = name
+        self.city = city
+        self.state = state
+        self.distance = distance
+
+
+def ring_cells(row, column, ring):
+    # the cells on the square ring `ring` cells away from (row, column)
+    if ring == 0:
+        return [(row, column)]
+    cells = []
+    for i in range(-ring, ring + 1):
+        cells.append((row - ring, column + i))
+        cells.append((row + ring, column + i))
+    for i in range(-ring + 1, ring):
+        cells.append((row + i, column - ring))
+        cells.append((row + i, column + ring))
+    return cells
+
+
+def venue_result(row, upcoming_shows):
+    return {
+        'id'            : row.id,
+        'name'          : row.name,
+        'city'          : row.city,
+        'state'         : row.state,
+        'distance_km'   : round(row.distance, 2),
+        'upcoming_shows': upcoming_shows
+    }
+
+
+def nearby_backend(config, db):
+    # Pick the backend from NEARBY_BACKEND, or from the database URI when unset
+    backend = config.get('NEARBY_BACKEND')
+    if backend is None:
+        uri = config.get('SQLALCHEMY_DATABASE_URI', '')
+        backend = 'gist' if uri.startswith('postgres') else 'grid'
+    if backend == 'grid':
+        return GridNearby(db, shows=config['NEARBY_SHOWS'], cell_degrees=config['NEARBY_GRID_DEGREES'])
+
+    return GistNearby(db, shows=config['NEARBY_SHOWS'])
+
+
+# ----------------------------------------------------------------------------#
+# Commands.
+# ----------------------------------------------------------------------------#
+@cli.command('geocode', help='Fill venue coordinates from the gazetteer, offline.')
+@click.option('--all', 'everything', is_flag=True, help='Geocode every venue, not only those without coordinates.')
+@click.option('--state-fallback', is_flag=True, help='Place venues of unknown cities at the centre of their state.')
+@click.option('--batch-size', default=1000, show_default=True)
+def geocode_command(everything, state_fallback, batch_size):
+    gazetteer = Gazetteer(current_app.config['GAZETTEER_PATH'])
+    located, missed = geocode_venues(gazetteer, everything, state_fallback, batch_size)
+    click.echo('%d venues located, %d not found in the gazetteer' % (located, missed))
@@ -0,0 +1,391 @@
+import csv
+import gzip
+import io
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy.dialects.postgresql import insert
+from werkzeug.datastructures import MultiDict
+
+from genres import normalize_genres
+from intervals import IntervalIndex
+from matches import mark_stale
+from models import db, Venue, Artist, Show
+from stats import refresh_genre_stats, refresh_show_stats
+from versions import bump_versions
+
+cli = AppGroup('import', help='Bulk load venues, artists and shows from CSV or JSONL files.')
+
+BOOLEAN_FIELDS = {'seeking_talent', 'seeking_venue'}
+FALSE_VALUES = {'', '0', 'f', 'false', 'n', 'no', 'off'}
+SHOW_TIME_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M')
+
+
+# ----------------------------------------------------------------------------#
+# Reading.
+# ----------------------------------------------------------------------------#
+def read_rows(path):
+    # Yield (line number, dict) from a CSV file with a header row or from a
+    # JSON lines file, either optionally gzipped
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', newline='') as file:
+        if path[:-3 if path.endswith('.gz') else None].endswith(('.jsonl', '.ndjson', '.json')):
+            for line_no, line in enumerate(file, 1):
+                if line.strip():
+                    yield line_no, json.loads(line)
+        else:
+            reader = csv.DictReader(file)
+            for row in reader:
+                yield reader.line_num, row
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    chunk = list(islice(rows, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(rows, size))
+
+
+# ----------------------------------------------------------------------------#
+# Validation.
+# ----------------------------------------------------------------------------#
+def form_data(row):
+    # The row as submitted form data: genres as a list ("Jazz,Blues" in CSV)
+    # spelled as the form's choices, booleans as the values BooleanField
+    # understands
+    data = MultiDict()
+    for key, value in row.items():
+        if value is None:
+            continue
+        if key == 'genres':
+            data.setlist(key, normalize_genres([value] if isinstance(value, str) else value))
+        elif key in BOOLEAN_FIELDS:
+            data[key] = 'n' if str(value).strip().lower() in FALSE_VALUES else 'y'
+        else:
+            data[key] = str(value).strip()
+    return data
+
+
+class FormRow(dict):
+    # The form's data for a row: one value per column, blanks for the columns
+    # the file left out, which are listed in `given` so updates skip them
+
+    def __init__(self, data, given):
+        super(FormRow, self).__init__(data)
+        self.given = frozenset(given)
+
+
+def form_validator(form_class):
+    # Check a row against the rules of the web form, like a submission would
+    # be, and return the form's data
+    def validate(row):
+        form = form_class(formdata=form_data(row), meta={'csrf': False})
+        if not form.validate():
+            return None, form.errors
+        return FormRow(form.data, [key for key, value in row.items() if value is not None and key in form.data]), \
+            None
+    return validate
+
+
+class ShowValidator(object):
+    # ShowForm checks its ids against the choice caches of a running app, so
+    # shows are checked directly: ids must exist, start_time must parse and
+    # the show must not overlap another one of its venue or artist, in the
+    # database or earlier in the file. Overlaps are looked up in interval
+    # indexes, loaded per chunk for the venues and artists it mentions.
+    # Much cheaper than a form and a query per row at millions of rows.
+    # Valid rows enter the indexes at once, to catch overlaps later in the
+    # chunk, and leave them again through discard if the database refuses
+    # them.
+
+    def __init__(self):
+        self.venue_ids = {id for id, in db.session.query(Venue.id)}
+        self.artist_ids = {id for id, in db.session.query(Artist.id)}
+        self.venue_shows = IntervalIndex()
+        self.artist_shows = IntervalIndex()
+
+    def prepare(self, chunk):
+        for key, intervals in (('venue_id', self.venue_shows), ('artist_id', self.artist_shows)):
+            ids = set()
+            for _, row in chunk:
+                try:
+                    ids.add(int(row.get(key)))
+                except (TypeError, ValueError):
+                    pass
+            load_intervals(intervals, getattr(Show, key), [id for id in ids if id not in intervals])
+
+    def __call__(self, row):
+        errors = {}
+        values = {}
+        for key, known in (('venue_id', self.venue_ids), ('artist_id', self.artist_ids)):
+            try:
+                values[key] = int(row.get(key))
+            except (TypeError, ValueError):
+                errors[key] = ['Not a valid id.']
+                continue
+            if values[key] not in known:
+                errors[key] = ['No such id.']
+        values['start_time'] = parse_start_time(row.get('start_time'))
+        if values['start_time'] is None:
+            errors['start_time'] = ['Not a valid datetime value.']
+        try:
+            values['duration'] = int(row.get('duration') or 120)
+        except (TypeError, ValueError):
+            values['duration'] = None
+        if not values['duration'] or not 0 < values['duration'] <= 24 * 60:
+            errors['duration'] = ['Must be between 1 and 1440 minutes.']
+        if errors:
+            return None, errors
+
+        start = values['start_time']
+        end = start + timedelta(minutes=values['duration'])
+        if self.venue_shows.overlaps(values['venue_id'], start, end):
+            errors['venue_id'] = ['The venue is already booked at that time.']
+        if self.artist_shows.overlaps(values['artist_id'], start, end):
+            errors['artist_id'] = ['The artist is already booked at that time.']
+        if errors:
+            return None, errors
+        self.venue_shows.add(values['venue_id'], start, end)
+        self.artist_shows.add(values['artist_id'], start, end)
+        return values, None
+
+    def discard(self, values):
+        end = values['start_time'] + timedelta(minutes=values['duration'])
+        self.venue_shows.remove(values['venue_id'], values['start_time'], end)
+        self.artist_shows.remove(values['artist_id'], values['start_time'], end)
+
+
+def load_intervals(intervals, key, ids):
+    # Add the existing shows of `ids` to an IntervalIndex, in one query
+    if not ids:
+        return
+    rows = db.session.query(key, Show.start_time, Show.duration).filter(key.in_(ids))
+    shows = {id: [] for id in ids}
+    for id, start_time, duration in rows:
+        shows[id].append((start_time, start_time + timedelta(minutes=duration)))
+    for id, existing in shows.items():
+        intervals.load(id, existing)
+
+
+def parse_start_time(value):
+    if isinstance(value, str):
+        value = value.strip()
+        for format in SHOW_TIME_FORMATS:
+            try:
+                return datetime.strptime(value, format)
+            except ValueError:
+                pass
+    return None
+
+
+# ----------------------------------------------------------------------------#
+# Writing.
+# ----------------------------------------------------------------------------#
+def upsert_entities(model, rows, update):
+    # One multi-row INSERT ... ON CONFLICT on the unique name per set of
+    # columns given in the file (one for a CSV file). Existing rows are only
+    # updated in those columns. Returns the ids of the rows written.
+    groups = {}
+    for row in rows:
+        groups.setdefault(getattr(row, 'given', frozenset(row)), []).append(row)
+    ids = []
+    for given, group in groups.items():
+        statement = insert(model).values(group)
+        if update:
+            set_ = {column: statement.excluded[column] for column in sorted(given) if column != 'name'}
+            if model is Venue and given & {'city', 'state'}:
+                # venues moving to another city or state are geocoded again
+                moved = db.or_(*[getattr(model, column).is_distinct_from(statement.excluded[column])
+                                 for column in ('city', 'state') if column in given])
+                set_['latitude'] = db.case((moved, None), else_=model.latitude)
+                set_['longitude'] = db.case((moved, None), else_=model.longitude)
+            if set_:
+                statement = statement.on_conflict_do_update(index_elements=[model.name], set_=set_)
+            else:
+                # nothing but the name: existing rows are left as they are
+                statement = statement.on_conflict_do_nothing(index_elements=[model.name])
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=[model.name])
+        ids += [id for id, in db.session.execute(statement.returning(model.id))]
+    return ids
+
+
+def copy_shows(rows):
+    # Stream the chunk through COPY, the fastest way in for rows without a key
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow((row['venue_id'], row['artist_id'], row['start_time'].isoformat(' '), row['duration']))
+    buffer.seek(0)
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert('COPY "Show" (venue_id, artist_id, start_time, duration) FROM STDIN WITH (FORMAT csv)',
+                       buffer)
+    return len(rows)
+
+
+def write_entities(model, rows, update):
+    # Upsert the rows and recount the genres they add, and the genres of the
+    # rows they overwrite, and queue their matches for a refresh. Returns the
+    # ids of the rows written.
+    rows = dedupe(rows)
+    genres = {genre for row in rows for genre in row['genres'] or ()}
+    if update:
+        listed = db.session.query(db.func.unnest(model.genres)) \
+            .filter(model.name.in_([row['name'] for row in rows])).distinct()
+        genres.update(genre for genre, in listed)
+    ids = upsert_entities(model, rows, update)
+    if ids:
+        refresh_genre_stats(genres)
+        mark_stale(**{'venue_ids' if model is Venue else 'artist_ids': ids})
+    return ids
+
+
+def linked_keys(prefix, ids, key, other, other_prefix):
+    # Page keys of written venues (or artists) and of the pages linking to them
+    if not ids:
+        return []
+    others = db.session.query(other).filter(key.in_(ids)).distinct()
+    return ['%s:%d' % (prefix, id) for id in ids] + ['%s:%d' % (other_prefix, id) for id, in others]
+
+
+class Loader(object):
+    # Validates and writes one kind of row, chunk by chunk
+
+    def __init__(self, validate, write, version_keys):
+        self.validate = validate
+        self.write = write
+        self.version_keys = version_keys
+
+    def load_chunk(self, chunk, report):
+        prepare = getattr(self.validate, 'prepare', None)
+        if prepare is not None:
+            prepare(chunk)
+        pairs = []
+        for line_no, row in chunk:
+            values, errors = self.validate(row)
+            if errors:
+                report(line_no, errors)
+            else:
+                pairs.append((line_no, values))
+        return self.load_valid(pairs, report) if pairs else 0
+
+    def load_valid(self, pairs, report):
+        # A row the database refuses spoils its whole statement: retry in
+        # halves to write every other row and pin down the culprit
+        lines = [line_no for line_no, _ in pairs]
+        rows = [row for _, row in pairs]
+        try:
+            return self.commit(rows)
+        except Exception as error:
+            # SQLAlchemy errors from the upserts, driver errors from COPY
+            db.session.rollback()
+            if len(rows) == 1:
+                report(lines[0], {'database': [str(getattr(error, 'orig', error)).strip()]})
+                discard = getattr(self.validate, 'discard', None)
+                if discard is not None:
+                    # the row was never written, later rows may take its place
+                    discard(rows[0])
+                return 0
+        middle = len(pairs) // 2
+        return self.load_valid(pairs[:middle], report) + self.load_valid(pairs[middle:], report)
+
+    def commit(self, rows):
+        written, keys = self.write(rows)
+        if written:
+            bump_versions(*self.version_keys(keys))
+        db.session.commit()
+        return written
+
+
+def venue_loader(update):
+    from forms import VenueForm
+
+    def write(rows):
+        ids = write_entities(Venue, rows, update)
+        return len(ids), linked_keys('venue', ids, Show.venue_id, Show.artist_id, 'artist')
+    return Loader(form_validator(VenueForm), write, lambda keys: ['Venue', 'VenueNames'] + keys)
+
+
+def artist_loader(update):
+    from forms import ArtistForm
+
+    def write(rows):
+        ids = write_entities(Artist, rows, update)
+        return len(ids), linked_keys('artist', ids, Show.artist_id, Show.venue_id, 'venue')
+    return Loader(form_validator(ArtistForm), write, lambda keys: ['Artist', 'ArtistNames'] + keys)
+
+
+def show_loader(update):
+    def write(rows):
+        venue_ids = {row['venue_id'] for row in rows}
+        artist_ids = {row['artist_id'] for row in rows}
+        written = copy_shows(rows)
+        refresh_show_stats(venue_ids, artist_ids)
+        mark_stale(venue_ids, artist_ids)
+        keys = ['venue:%d' % id for id in sorted(venue_ids)] + ['artist:%d' % id for id in sorted(artist_ids)]
+        return written, keys
+    return Loader(ShowValidator(), write, lambda keys: ['Show'] + keys)
+
+
+def dedupe(rows):
+    # ON CONFLICT DO UPDATE cannot touch the same row twice in one statement,
+    # the last row of a name wins
+    return list({row['name']: row for row in rows}.values())
+
+
+LOADERS = {
+    'venues' : venue_loader,
+    'artists': artist_loader,
+    'shows'  : show_loader,
+}
+
+
+# ----------------------------------------------------------------------------#
+# Commands.
+# ----------------------------------------------------------------------------#
+def run_import(kind, path, chunk_size, update, errors_file):
+    loader = LOADERS[kind](update)
+    read = written = rejected = 0
+    started = time.perf_counter()
+
+    def report(line_no, errors):
+        nonlocal rejected
+        rejected += 1
+        for field, messages in errors.items():
+            for message in messages:
+                click.echo('%s:%d: %s: %s' % (path, line_no, field, message), file=errors_file)
+
+    for chunk in chunked(read_rows(path), chunk_size):
+        read += len(chunk)
+        written += loader.load_chunk(chunk, report)
+        elapsed = time.perf_counter() - started
+        click.echo('%s: %d read, %d written, %d rejected, %.0f rows/s' % (
+            kind, read, written, rejected, read / elapsed if elapsed else 0), err=True)
+
+    return read, written, rejected
+
+
+def import_command(kind):
+    @cli.command(kind, help='Load %s from CSV or JSONL files (optionally .gz).' % kind)
+    @click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+    @click.option('--chunk-size', default=5000, show_default=True, help='Rows validated and written per transaction.')
+    @click.option('--skip-existing', is_flag=True, help='Keep rows whose name already exists instead of updating them.')
+    @click.option('--errors', type=click.File('w'), default='-', help='Where to write per-row errors.')
+    def command(paths, chunk_size, skip_existing, errors):
+        failed = False
+        for path in paths:
+            read, written, rejected = run_import(kind, path, chunk_size, not skip_existing, errors)
+            failed = failed or rejected
+        if failed:
+            sys.exit(1)
+    return command
+
+
+for kind in LOADERS:
+    import_command(kind)
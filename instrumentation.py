@@ -0,0 +1,235 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from flask import current_app, g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import database
+
+# Request duration histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Expanded IN lists differ in length only, they are the same query shape
+IN_LIST = re.compile(r'IN \((?:[^()]*?, )+[^()]*?\)|IN \(__\[POSTCOMPILE_\w+\]\)')
+
+
+# ----------------------------------------------------------------------------#
+# Per request.
+# ----------------------------------------------------------------------------#
+class RequestStats(object):
+    # Statements, database time and template time of the current request,
+    # kept in `g` while instrumentation is on
+
+    __slots__ = ('started', 'statements', 'db_time', 'template_time', 'template_started', 'shapes')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_started = None
+        # statement shape -> [count, total seconds, slowest seconds]
+        self.shapes = {}
+
+    def statement(self, shape, seconds):
+        self.statements += 1
+        self.db_time += seconds
+        totals = self.shapes.get(shape)
+        if totals is None:
+            self.shapes[shape] = [1, seconds, seconds]
+        else:
+            totals[0] += 1
+            totals[1] += seconds
+            if seconds > totals[2]:
+                totals[2] = seconds
+
+
+def query_shape(statement):
+    return IN_LIST.sub('IN (...)', statement)
+
+
+def current_stats():
+    if has_request_context():
+        return g.get('request_stats')
+    return None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_stats() is not None:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_stats()
+    started = conn.info.get('query_started')
+    if stats is not None and started:
+        stats.statement(query_shape(statement), time.perf_counter() - started.pop())
+
+
+def on_before_render(sender, template, context, **extra):
+    stats = current_stats()
+    if stats is not None:
+        stats.template_started = time.perf_counter()
+
+
+def on_rendered(sender, template, context, **extra):
+    stats = current_stats()
+    if stats is not None and stats.template_started is not None:
+        stats.template_time += time.perf_counter() - stats.template_started
+        stats.template_started = None
+
+
+# ----------------------------------------------------------------------------#
+# Per route.
+# ----------------------------------------------------------------------------#
+class Metrics(object):
+    # Per endpoint totals of this worker, with the slowest statement shapes
+    # and the shapes flagged as N+1 patterns
+
+    def __init__(self, slow_kept=5):
+        self.slow_kept = slow_kept
+        self.lock = threading.Lock()
+        self.routes = {}
+
+    def record(self, endpoint, seconds, stats, repeated):
+        slowest = sorted(((totals[2], shape) for shape, totals in stats.shapes.items()), reverse=True)
+        with self.lock:
+            route = self.routes.get(endpoint)
+            if route is None:
+                route = self.routes[endpoint] = {
+                    'requests'        : 0,
+                    'seconds'         : 0.0,
+                    'buckets'         : [0] * len(BUCKETS),
+                    'statements'      : 0,
+                    'db_seconds'      : 0.0,
+                    'template_seconds': 0.0,
+                    'n_plus_one'      : 0,
+                    'slowest'         : [],
+                    'repeated'        : {},
+                }
+            route['requests'] += 1
+            route['seconds'] += seconds
+            i = bisect_left(BUCKETS, seconds)
+            if i < len(BUCKETS):
+                route['buckets'][i] += 1
+            route['statements'] += stats.statements
+            route['db_seconds'] += stats.db_time
+            route['template_seconds'] += stats.template_time
+            if repeated:
+                route['n_plus_one'] += 1
+                for shape, count in repeated.items():
+                    route['repeated'][shape] = max(count, route['repeated'].get(shape, 0))
+            kept = dict((shape, slowest_seconds) for slowest_seconds, shape in route['slowest'])
+            for slowest_seconds, shape in slowest[:self.slow_kept]:
+                kept[shape] = max(slowest_seconds, kept.get(shape, 0))
+            route['slowest'] = sorted(((kept_seconds, shape) for shape, kept_seconds in kept.items()),
+                                      reverse=True)[:self.slow_kept]
+
+    def info(self):
+        # JSON view: totals, slowest statements and N+1 shapes per endpoint
+        with self.lock:
+            return {endpoint: {
+                'requests'           : route['requests'],
+                'seconds'            : round(route['seconds'], 6),
+                'statements'         : route['statements'],
+                'db_seconds'         : round(route['db_seconds'], 6),
+                'template_seconds'   : round(route['template_seconds'], 6),
+                'n_plus_one_requests': route['n_plus_one'],
+                'n_plus_one_shapes'  : dict(route['repeated']),
+                'slowest_statements' : [
+                    {'seconds': round(seconds, 6), 'statement': shape} for seconds, shape in route['slowest']
+                ],
+            } for endpoint, route in self.routes.items()}
+
+    def prometheus(self):
+        # Text exposition format, series per endpoint, plus the pool gauges
+        lines = []
+
+        def family(name, type, help):
+            lines.append('# HELP %s %s' % (name, help))
+            lines.append('# TYPE %s %s' % (name, type))
+
+        with self.lock:
+            routes = sorted((endpoint, dict(route, buckets=list(route['buckets'])))
+                            for endpoint, route in self.routes.items())
+
+        family('fyyur_request_duration_seconds', 'histogram', 'Request duration by endpoint.')
+        for endpoint, route in routes:
+            cumulative = 0
+            for bound, count in zip(BUCKETS, route['buckets']):
+                cumulative += count
+                lines.append('fyyur_request_duration_seconds_bucket%s %d' % (
+                    label(endpoint=endpoint, le=bound), cumulative))
+            lines.append('fyyur_request_duration_seconds_bucket%s %d' % (
+                label(endpoint=endpoint, le='+Inf'), route['requests']))
+            lines.append('fyyur_request_duration_seconds_sum%s %r' % (label(endpoint=endpoint), route['seconds']))
+            lines.append('fyyur_request_duration_seconds_count%s %d' % (label(endpoint=endpoint), route['requests']))
+        for name, key, type, help in (
+                ('fyyur_db_statements_total', 'statements', 'counter', 'SQL statements executed, by endpoint.'),
+                ('fyyur_db_seconds_total', 'db_seconds', 'counter', 'Time spent in SQL statements, by endpoint.'),
+                ('fyyur_template_seconds_total', 'template_seconds', 'counter',
+                 'Time spent rendering templates, by endpoint.'),
+                ('fyyur_n_plus_one_requests_total', 'n_plus_one', 'counter',
+                 'Requests repeating one statement shape past the N+1 threshold, by endpoint.')):
+            family(name, type, help)
+            for endpoint, route in routes:
+                lines.append('%s%s %r' % (name, label(endpoint=endpoint), route[key]))
+
+        pool = database.stats.info()
+        for name, key, type, help in (
+                ('fyyur_db_pool_in_use', 'in_use', 'gauge', 'Connections checked out of the pool.'),
+                ('fyyur_db_pool_checkouts_total', 'checkouts', 'counter', 'Connection checkouts.'),
+                ('fyyur_db_pool_wait_seconds_total', 'wait_seconds_sum', 'counter',
+                 'Time spent waiting for a pool connection.')):
+            family(name, type, help)
+            lines.append('%s %r' % (name, pool[key]))
+
+        return '\n'.join(lines) + '\n'
+
+
+def label(**labels):
+    return '{%s}' % ','.join('%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"')
+                                          .replace('\n', '\\n')) for key, value in labels.items())
+
+
+# ----------------------------------------------------------------------------#
+# Hooks.
+# ----------------------------------------------------------------------------#
+def start_request():
+    g.request_stats = RequestStats()
+
+
+def finish_request(response):
+    stats = g.pop('request_stats', None)
+    if stats is None:
+        return response
+    seconds = time.perf_counter() - stats.started
+    config = current_app.config
+    threshold = config['N_PLUS_ONE_THRESHOLD']
+    repeated = {shape: totals[0] for shape, totals in stats.shapes.items() if totals[0] >= threshold}
+    for shape, count in repeated.items():
+        current_app.logger.warning('N+1 in %s: statement ran %d times: %s', request.endpoint, count, shape)
+    current_app.extensions['metrics'].record(request.endpoint or 'unmatched', seconds, stats, repeated)
+
+    if config['SERVER_TIMING']:
+        # streamed bodies are rendered after this point and not included
+        response.headers.add('Server-Timing', 'db;dur=%.2f;desc="%d statements"' % (
+            stats.db_time * 1000, stats.statements))
+        response.headers.add('Server-Timing', 'tpl;dur=%.2f' % (stats.template_time * 1000))
+        response.headers.add('Server-Timing', 'app;dur=%.2f' % (seconds * 1000))
+    return response
+
+
+def init_app(app):
+    app.extensions['metrics'] = Metrics(slow_kept=app.config['SLOW_STATEMENTS_KEPT'])
+    if not app.config['INSTRUMENTATION']:
+        return
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    before_render_template.connect(on_before_render, app)
+    template_rendered.connect(on_rendered, app)
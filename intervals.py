@@ -0,0 +1,48 @@
+from bisect import bisect_left
+
+
+# ----------------------------------------------------------------------------#
+# Interval index.
+# ----------------------------------------------------------------------------#
+class IntervalIndex(object):
+    # Half-open [start, end) intervals per key (a venue or an artist id) that
+    # never overlap each other, the invariant the exclusion constraints keep
+    # in the database. Sorted by start, their ends are sorted too, so the
+    # only interval that can overlap a new one is the last one starting
+    # before its end: overlap checks are one binary search.
+
+    def __init__(self):
+        self.starts = {}
+        self.ends = {}
+
+    def __contains__(self, key):
+        return key in self.starts
+
+    def load(self, key, intervals):
+        # Start tracking `key` with its existing (start, end) intervals
+        intervals = sorted(intervals)
+        self.starts[key] = [start for start, _ in intervals]
+        self.ends[key] = [end for _, end in intervals]
+
+    def overlaps(self, key, start, end):
+        starts = self.starts.get(key)
+        if not starts:
+            return False
+        i = bisect_left(starts, end) - 1
+        return i >= 0 and self.ends[key][i] > start
+
+    def add(self, key, start, end):
+        starts = self.starts.setdefault(key, [])
+        ends = self.ends.setdefault(key, [])
+        i = bisect_left(starts, start)
+        starts.insert(i, start)
+        ends.insert(i, end)
+
+    def remove(self, key, start, end):
+        starts = self.starts.get(key)
+        if not starts:
+            return
+        i = bisect_left(starts, start)
+        if i < len(starts) and starts[i] == start and self.ends[key][i] == end:
+            del starts[i]
+            del self.ends[key][i]
@@ -0,0 +1,334 @@
+import json
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import aliased
+
+from instrumentation import label
+from models import db, Job
+
+cli = AppGroup('jobs', help='Run and inspect the background job queue.')
+
+# task name -> function, filled by @task in the modules defining the work
+TASKS = {}
+OUTCOMES = ('done', 'retried', 'failed')
+
+
+# ----------------------------------------------------------------------------#
+# Queueing.
+# ----------------------------------------------------------------------------#
+def task(name):
+    # Register a function as the task `name`. Workers call it in an app
+    # context with the job payload as keyword arguments and commit its
+    # writes with the job's status. A failed job runs again, so a task must
+    # be safe to repeat.
+    def decorator(function):
+        TASKS[name] = function
+        return function
+    return decorator
+
+
+def enqueue(name, key=None, delay=0, **payload):
+    # Queue a job in the current transaction: workers see it once the caller
+    # commits, and never if it rolls back. While a job with the same `key` is
+    # queued, this one is dropped, so keyed tasks must read what to do from
+    # the database rather than from their payload.
+    now = datetime.now()
+    statement = insert(Job).values(task=name, payload=payload, key=key, status='queued', attempts=0,
+                                   run_at=now + timedelta(seconds=delay), created_at=now)
+    if key is not None:
+        statement = statement.on_conflict_do_nothing(
+            index_elements=[Job.key], index_where=db.and_(Job.status == 'queued', Job.key.isnot(None)))
+    db.session.execute(statement)
+
+
+# ----------------------------------------------------------------------------#
+# Running.
+# ----------------------------------------------------------------------------#
+def claim(worker, now=None):
+    # Mark the oldest due job running and return (id, task, payload,
+    # attempts), or None. SKIP LOCKED lets any number of workers poll at once.
+    now = now or datetime.now()
+    due = db.select(Job.id) \
+        .where(Job.status == 'queued', Job.run_at <= now) \
+        .order_by(Job.run_at, Job.id) \
+        .limit(1) \
+        .with_for_update(skip_locked=True) \
+        .scalar_subquery()
+    row = db.session.execute(
+        db.update(Job).where(Job.id == due)
+        .values(status='running', attempts=Job.attempts + 1, started_at=now, worker=worker)
+        .returning(Job.id, Job.task, Job.payload, Job.attempts)
+        .execution_options(synchronize_session=False)
+    ).first()
+    db.session.commit()
+    return row
+
+
+def retry_delay(attempts, base, cap):
+    # Exponential backoff with jitter, so jobs failing together spread out
+    return min(cap, base * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+
+
+def finish(id, attempts, error=None, now=None):
+    # Record the outcome of a run in its own transaction: 'done', 'retried'
+    # (queued again after a backoff) or 'failed' (out of attempts). A job
+    # whose queued twin will redo the same work is dropped instead of queued.
+    config = current_app.config
+    now = now or datetime.now()
+    job = Job.id == id
+    if error is None:
+        outcome = 'done'
+        statement = db.update(Job).where(job).values(status='done', finished_at=now, error=None)
+    else:
+        message = ''.join(traceback.format_exception_only(type(error), error)).strip()
+        if attempts < config['JOBS_MAX_ATTEMPTS']:
+            outcome = 'retried'
+            twin = aliased(Job)
+            db.session.execute(db.delete(Job).where(job, db.exists().where(
+                twin.status == 'queued', twin.key == Job.key)).execution_options(synchronize_session=False))
+            delay = retry_delay(attempts, config['JOBS_BACKOFF'], config['JOBS_BACKOFF_MAX'])
+            statement = db.update(Job).where(job).values(status='queued', run_at=now + timedelta(seconds=delay),
+                                                         error=message)
+        else:
+            outcome = 'failed'
+            statement = db.update(Job).where(job).values(status='failed', finished_at=now, error=message)
+    db.session.execute(statement.execution_options(synchronize_session=False))
+    db.session.commit()
+    return outcome
+
+
+def run_job(worker, metrics=None):
+    # Claim and run one due job. Returns False when none is due.
+    claimed = claim(worker)
+    if claimed is None:
+        return False
+    id, name, payload, attempts = claimed
+    started = time.perf_counter()
+    try:
+        TASKS[name](**payload)
+    except Exception as error:
+        db.session.rollback()
+        current_app.logger.warning('job %d (%s) failed, attempt %d: %s', id, name, attempts, error)
+        outcome = finish(id, attempts, error)
+    else:
+        outcome = finish(id, attempts)
+    if metrics is not None:
+        metrics.record(name, time.perf_counter() - started, outcome)
+    return True
+
+
+def sweep(now=None):
+    # Requeue the jobs left running past JOBS_TIMEOUT by a worker that died
+    # (or fail them when out of attempts), and delete the jobs done more
+    # than JOBS_KEEP_FINISHED seconds ago. Returns the number requeued.
+    config = current_app.config
+    now = now or datetime.now()
+    stuck = db.and_(Job.status == 'running', Job.started_at < now - timedelta(seconds=config['JOBS_TIMEOUT']))
+    twin = aliased(Job)
+    options = {'synchronize_session': False}
+    db.session.execute(db.delete(Job).where(stuck, db.exists().where(twin.status == 'queued', twin.key == Job.key))
+                       .execution_options(**options))
+    db.session.execute(db.update(Job).where(stuck, Job.attempts >= config['JOBS_MAX_ATTEMPTS'])
+                       .values(status='failed', finished_at=now, error='timed out').execution_options(**options))
+    requeued = db.session.execute(db.update(Job).where(stuck).values(status='queued', run_at=now, error='timed out')
+                                  .execution_options(**options)).rowcount
+    db.session.execute(db.delete(Job).where(
+        Job.status == 'done', Job.finished_at < now - timedelta(seconds=config['JOBS_KEEP_FINISHED']))
+                       .execution_options(**options))
+    db.session.commit()
+    return requeued
+
+
+def drain(worker='drain', metrics=None):
+    # Run every due job in this thread, for scripts and the benchmarks.
+    # Returns the number of jobs run.
+    count = 0
+    while run_job(worker, metrics):
+        count += 1
+    return count
+
+
+class Worker(object):
+    # A pool of threads, each running one job at a time and polling every
+    # JOBS_POLL_INTERVAL seconds when the queue is idle. One thread sweeps
+    # stuck and old jobs every JOBS_SWEEP_INTERVAL seconds.
+
+    def __init__(self, app, threads=2, name=None):
+        self.app = app
+        self.threads = threads
+        self.name = name or '%s:%d' % (socket.gethostname(), os.getpid())
+        self.metrics = app.extensions['job_metrics']
+        self.stopping = threading.Event()
+        self.pool = []
+        self.lock = threading.Lock()
+        self.swept = 0.0
+
+    def start(self):
+        for i in range(self.threads):
+            thread = threading.Thread(target=self.run, name='jobs-%d' % i, daemon=True)
+            thread.start()
+            self.pool.append(thread)
+
+    def stop(self, timeout=None):
+        # jobs in progress finish first
+        self.stopping.set()
+        for thread in self.pool:
+            thread.join(timeout)
+
+    def run(self):
+        interval = self.app.config['JOBS_POLL_INTERVAL']
+        while not self.stopping.is_set():
+            with self.app.app_context():
+                try:
+                    self.maybe_sweep()
+                    busy = run_job(self.name, self.metrics)
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception('job worker failed')
+                    busy = False
+            if not busy:
+                self.stopping.wait(interval)
+
+    def maybe_sweep(self):
+        if time.monotonic() - self.swept < self.app.config['JOBS_SWEEP_INTERVAL'] or \
+                not self.lock.acquire(blocking=False):
+            return
+        try:
+            self.swept = time.monotonic()
+            sweep()
+        finally:
+            self.lock.release()
+
+
+class StartWorkers(object):
+    # Starts JOBS_WORKERS threads in this process on its first request, so
+    # nothing runs in CLI commands or before a server forks
+
+    def __init__(self, app):
+        self.app = app
+        self.worker = None
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        if self.worker is not None or not self.app.config['JOBS_WORKERS']:
+            return
+        with self.lock:
+            if self.worker is None:
+                self.worker = Worker(self.app, threads=self.app.config['JOBS_WORKERS'])
+                self.worker.start()
+
+
+# ----------------------------------------------------------------------------#
+# Metrics.
+# ----------------------------------------------------------------------------#
+class JobMetrics(object):
+    # Per task totals of the jobs run by this process
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tasks = {}
+
+    def record(self, name, seconds, outcome):
+        with self.lock:
+            totals = self.tasks.get(name)
+            if totals is None:
+                totals = self.tasks[name] = dict.fromkeys(OUTCOMES, 0)
+                totals['seconds'] = 0.0
+            totals[outcome] += 1
+            totals['seconds'] += seconds
+
+    def info(self):
+        with self.lock:
+            return {name: dict(totals, seconds=round(totals['seconds'], 6)) for name, totals in self.tasks.items()}
+
+    def prometheus(self, queue):
+        # Text exposition lines for these totals and the `queue` gauges
+        lines = []
+
+        def family(name, type, help):
+            lines.append('# HELP %s %s' % (name, help))
+            lines.append('# TYPE %s %s' % (name, type))
+
+        totals = sorted(self.info().items())
+        family('fyyur_jobs_total', 'counter', 'Jobs run by this process, by task and outcome.')
+        for name, task_totals in totals:
+            for outcome in OUTCOMES:
+                lines.append('fyyur_jobs_total%s %d' % (label(task=name, outcome=outcome), task_totals[outcome]))
+        family('fyyur_job_seconds_total', 'counter', 'Time spent running jobs, by task.')
+        for name, task_totals in totals:
+            lines.append('fyyur_job_seconds_total%s %r' % (label(task=name), task_totals['seconds']))
+        family('fyyur_jobs', 'gauge', 'Jobs in the queue table, by task and status.')
+        for name, statuses in sorted(queue['jobs'].items()):
+            for status, count in sorted(statuses.items()):
+                lines.append('fyyur_jobs%s %d' % (label(task=name, status=status), count))
+        family('fyyur_job_queue_lag_seconds', 'gauge', 'How long the oldest due job has waited.')
+        lines.append('fyyur_job_queue_lag_seconds %r' % queue['lag_seconds'])
+
+        return '\n'.join(lines) + '\n'
+
+
+def queue_stats(now=None):
+    # Jobs per task and status, and the wait of the oldest due job
+    now = now or datetime.now()
+    jobs = {}
+    for name, status, count in db.session.query(Job.task, Job.status, db.func.count()).group_by(Job.task,
+                                                                                              Job.status):
+        jobs.setdefault(name, {})[status] = count
+    oldest = db.session.query(db.func.min(Job.run_at)).filter(Job.status == 'queued', Job.run_at <= now).scalar()
+    return {
+        'jobs'       : jobs,
+        'lag_seconds': round((now - oldest).total_seconds(), 3) if oldest else 0.0,
+    }
+
+
+def init_app(app):
+    app.extensions['job_metrics'] = JobMetrics()
+    app.before_request(StartWorkers(app))
+
+
+# ----------------------------------------------------------------------------#
+# Commands.
+# ----------------------------------------------------------------------------#
+@cli.command('work', help='Run a pool of job worker threads until interrupted.')
+@click.option('--threads', default=4, show_default=True)
+def work_command(threads):
+    worker = Worker(current_app._get_current_object(), threads=threads)
+    worker.start()
+    click.echo('%s running %d threads' % (worker.name, threads))
+    try:
+        while not worker.stopping.wait(1):
+            pass
+    except KeyboardInterrupt:
+        click.echo('stopping after the jobs in progress')
+        worker.stop()
+
+
+@cli.command('stats', help='Print the queue counts and lag.')
+def stats_command():
+    click.echo(json.dumps(queue_stats(), indent=2))
+
+
+@cli.command('retry', help='Queue the failed jobs again.')
+@click.option('--task', 'name', help='Only jobs of this task.')
+def retry_command(name):
+    # one job per key, and none whose queued twin will do the same work
+    twin = aliased(Job)
+    failed = db.and_(Job.status == 'failed', ~db.exists().where(twin.key == Job.key, db.or_(
+        twin.status == 'queued', db.and_(twin.status == 'failed', twin.id > Job.id))))
+    if name:
+        failed = db.and_(failed, Job.task == name)
+    count = db.session.execute(db.update(Job).where(failed).values(status='queued', attempts=0, run_at=datetime.now(),
+                                                                   finished_at=None)
+                               .execution_options(synchronize_session=False)).rowcount
+    db.session.commit()
+    click.echo('%d jobs queued again' % count)
@@ -0,0 +1,322 @@
+import heapq
+from bisect import bisect_right, insort
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy.dialects.postgresql import insert
+
+from genres import GENRES
+from jobs import enqueue, task
+from models import db, Venue, Artist, Show, VenueMatch, ArtistMatch, StaleMatch
+from versions import bump_versions
+
+cli = AppGroup('matches', help='Precompute the venue and artist recommendations.')
+
+# kind -> (model, seeking column, match table, list owner column, listed column, listed kind)
+SIDES = {
+    'venue' : (Venue, Venue.seeking_talent, VenueMatch, VenueMatch.venue_id, VenueMatch.artist_id, 'artist'),
+    'artist': (Artist, Artist.seeking_venue, ArtistMatch, ArtistMatch.artist_id, ArtistMatch.venue_id, 'venue'),
+}
+CHUNK_SIZE = 5000
+
+
+# ----------------------------------------------------------------------------#
+# Scoring.
+# ----------------------------------------------------------------------------#
+if hasattr(int, 'bit_count'):
+    popcount = int.bit_count
+else:
+    def popcount(mask):
+        return bin(mask).count('1')
+
+
+def jaccard(mask, other):
+    union = mask | other
+    return popcount(mask & other) / float(popcount(union)) if union else 0.0
+
+
+def place_score(city, state, other_city, other_state):
+    # 1 in the same city, 0.5 elsewhere in the same state
+    if not state or state != other_state:
+        return 0.0
+    return 1.0 if city and city == other_city else 0.5
+
+
+class GenreBits(object):
+    # Genre sets as int bitmaps: one bit per genre, GENRES first and other
+    # names as they are met, so overlaps are an AND and a popcount
+
+    def __init__(self):
+        self.bits = {genre: 1 << i for i, genre in enumerate(GENRES)}
+
+    def mask(self, genres):
+        mask = 0
+        for genre in genres or ():
+            bit = self.bits.get(genre)
+            if bit is None:
+                bit = self.bits[genre] = 1 << len(self.bits)
+            mask |= bit
+        return mask
+
+
+class Targets(object):
+    # The seeking venues (or artists) that can be recommended, indexed by
+    # genre bitmap (ids in order, and (id, city) per state) and by state and
+    # (state, city)
+
+    def __init__(self, profiles):
+        self.by_mask = {}
+        self.in_state = {}
+        self.places = {}
+        for id in sorted(profiles):
+            mask, city, state = profiles[id]
+            self.by_mask.setdefault(mask, []).append(id)
+            if state:
+                self.in_state.setdefault((mask, state), []).append((id, city))
+                self.places.setdefault(state, []).append(id)
+                self.places.setdefault((state, city), []).append(id)
+
+
+class Matcher(object):
+    # Scores venue/artist pairs: weighted genre overlap (Jaccard over the
+    # genre bitmaps), same city or state, and shows played together.
+    #
+    # The top k of one venue (or artist) is exact without scoring every
+    # pair: the targets' bitmaps are walked by decreasing overlap until the
+    # best overlap left cannot beat k of the scores found, then the targets
+    # of its state without any genre in common are added, and its past
+    # partners are scored one by one. Targets of one bitmap in other states
+    # score the same, so the first k of them by id are enough.
+
+    def __init__(self, venues, artists, history, weights, k=10):
+        self.weights = weights
+        self.k = k
+        self.profiles = {'venue': venues, 'artist': artists}
+        self.targets = {kind: Targets(profiles) for kind, profiles in self.profiles.items()}
+        self.history = {'venue': {}, 'artist': {}}
+        for venue_id, artist_id in history:
+            self.history['venue'].setdefault(venue_id, set()).add(artist_id)
+            self.history['artist'].setdefault(artist_id, set()).add(venue_id)
+        self.ranked_masks = {}
+
+    @classmethod
+    def load(cls, weights, k):
+        # Profiles of every seeking venue and artist, and the pairs among
+        # them that have shared a show
+        bits = GenreBits()
+        profiles = {}
+        for kind, (model, seeking, _, _, _, _) in SIDES.items():
+            rows = db.session.query(model.id, model.genres, model.city, model.state).filter(seeking.is_(True))
+            profiles[kind] = {id: (bits.mask(genres), (city or '').strip().lower(), (state or '').strip().lower())
+                              for id, genres, city, state in rows}
+        history = db.session.query(Show.venue_id, Show.artist_id) \
+            .join(Venue, Show.venue_id == Venue.id) \
+            .join(Artist, Show.artist_id == Artist.id) \
+            .filter(Venue.seeking_talent.is_(True), Artist.seeking_venue.is_(True)) \
+            .distinct()
+
+        return cls(profiles['venue'], profiles['artist'], history, weights, k)
+
+    def combine(self, genre, place, shared):
+        weights = self.weights
+        return weights['genre'] * genre + weights['place'] * place + weights['history'] * shared
+
+    def score(self, source, target, shared):
+        mask, city, state = source
+        target_mask, target_city, target_state = target
+        return self.combine(jaccard(mask, target_mask), place_score(city, state, target_city, target_state), shared)
+
+    def ranked(self, kind, mask):
+        # (overlap, bitmap) of the `kind` targets' bitmaps sharing a genre
+        # with `mask`, best first
+        key = (kind, mask)
+        ranked = self.ranked_masks.get(key)
+        if ranked is None:
+            ranked = self.ranked_masks[key] = sorted(
+                ((overlap, other) for overlap, other in ((jaccard(mask, other), other)
+                                                         for other in self.targets[kind].by_mask) if overlap > 0),
+                key=lambda item: -item[0])
+        return ranked
+
+    def top(self, kind, id):
+        # [(score, id)] of the best matches of one venue (or artist), best
+        # first, at most k and none scoring 0
+        source = self.profiles[kind].get(id)
+        if source is None:
+            return []
+        other = SIDES[kind][5]
+        profiles = self.profiles[other]
+        targets = self.targets[other]
+        weights = self.weights
+        mask, city, state = source
+        best = {}
+        scores = []
+
+        elsewhere = 0
+        lowest = None
+        ranked = self.ranked(other, mask)
+        for position, (overlap, other_mask) in enumerate(ranked):
+            genre = weights['genre'] * overlap
+            for target, target_city in targets.in_state.get((other_mask, state), ()):
+                best[target] = score = genre + weights['place'] * place_score(city, state, target_city, state)
+                insort(scores, score)
+            if elsewhere < self.k or genre == lowest:
+                # other states until k of them are in, and their ties
+                taken = 0
+                for target in targets.by_mask[other_mask]:
+                    if taken == self.k:
+                        break
+                    if target not in best:
+                        best[target] = lowest = genre
+                        insort(scores, genre)
+                        taken += 1
+                elsewhere += taken
+            # the most any target left can score
+            left = weights['genre'] * ranked[position + 1][0] if position + 1 < len(ranked) else 0.0
+            if state:
+                left += weights['place']
+            if len(scores) - bisect_right(scores, left) >= self.k:
+                break
+
+        if state:
+            # no genre in common: the same city first, then the rest of the state
+            for place, ids in ((1.0, targets.places.get((state, city), ()) if city else ()),
+                               (0.5, targets.places.get(state, ()))):
+                taken = 0
+                for target in ids:
+                    if taken == self.k:
+                        break
+                    target_mask, target_city, _ = profiles[target]
+                    if not mask & target_mask and place_score(city, state, target_city, state) == place:
+                        best[target] = weights['place'] * place
+                        taken += 1
+
+        for target in self.history[kind].get(id, ()):
+            profile = profiles.get(target)
+            if profile is not None:
+                best[target] = self.score(source, profile, 1)
+
+        return heapq.nsmallest(self.k, ((score, target) for target, score in best.items() if score > 0),
+                               key=lambda item: (-item[0], item[1]))
+
+    def scores(self, kind, id):
+        # (id, score) against every target, to find the lists `id` enters
+        source = self.profiles[kind].get(id)
+        if source is None:
+            return
+        shared = self.history[kind].get(id, ())
+        for target, profile in self.profiles[SIDES[kind][5]].items():
+            yield target, self.score(source, profile, target in shared)
+
+
+# ----------------------------------------------------------------------------#
+# Maintenance.
+# ----------------------------------------------------------------------------#
+def mark_stale(venue_ids=(), artist_ids=()):
+    # Queue the matches of these venues and artists for the next refresh,
+    # inside the transaction changing their profile or shows, and a refresh
+    # job unless one is already queued. A row already marked is stamped
+    # again, so a refresh running on the older stamp leaves it behind.
+    now = datetime.now()
+    rows = [{'kind': 'venue', 'id': id, 'marked_at': now} for id in set(venue_ids)] + \
+        [{'kind': 'artist', 'id': id, 'marked_at': now} for id in set(artist_ids)]
+    if rows:
+        statement = insert(StaleMatch).values(rows)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[StaleMatch.kind, StaleMatch.id],
+            set_={'marked_at': statement.excluded.marked_at}
+        ))
+        enqueue('refresh_matches', key='refresh_matches', delay=current_app.config['MATCH_REFRESH_DELAY'])
+
+
+def chunked(items, size=CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def list_floors(kind, k):
+    # owner id -> score of the last entry of its full match list
+    _, _, table, owner, _, _ = SIDES[kind]
+    rows = db.session.query(owner, db.func.count(), db.func.min(table.score)).group_by(owner)
+    return {id: lowest for id, count, lowest in rows if count >= k}
+
+
+def write_lists(matcher, kind, ids, now, everything=False):
+    # Replace the match lists of `ids` (every list with `everything`)
+    _, _, table, owner, listed, _ = SIDES[kind]
+    rows = []
+    for id in sorted(ids):
+        for rank, (score, other) in enumerate(matcher.top(kind, id), 1):
+            rows.append({owner.key: id, listed.key: other, 'rank': rank, 'score': round(score, 6),
+                         'computed_at': now})
+    if everything:
+        db.session.execute(db.delete(table))
+    else:
+        for chunk in chunked(ids):
+            db.session.execute(db.delete(table).where(owner.in_(chunk)))
+    for chunk in chunked(rows):
+        db.session.execute(db.insert(table), chunk)
+
+
+@task('refresh_matches')
+def refresh_matches(everything=False, now=None):
+    # Recompute the match lists of the stale venues and artists, and of the
+    # venues (or artists) whose lists they leave or now enter. With
+    # `everything` every list is rebuilt. Returns the number of lists
+    # recomputed.
+    config = current_app.config
+    now = now or datetime.now()
+    marked = db.session.query(StaleMatch.kind, StaleMatch.id, StaleMatch.marked_at) \
+        .with_for_update(skip_locked=True).all()
+    if not marked and not everything:
+        return 0
+    matcher = Matcher.load(config['MATCH_WEIGHTS'], config['MATCH_TOP_K'])
+
+    todo = {'venue': set(), 'artist': set()}
+    if everything:
+        for kind, (_, _, _, owner, _, _) in SIDES.items():
+            todo[kind] = set(matcher.profiles[kind]) | {id for id, in db.session.query(owner).distinct()}
+    else:
+        for kind, id, _ in marked:
+            todo[kind].add(id)
+        for kind in SIDES:
+            stale = sorted(todo[kind])
+            other = SIDES[kind][5]
+            _, _, _, other_owner, other_listed, _ = SIDES[other]
+            for chunk in chunked(stale):
+                todo[other].update(id for id, in db.session.query(other_owner)
+                                   .filter(other_listed.in_(chunk)).distinct())
+            floors = list_floors(other, matcher.k)
+            for id in stale:
+                todo[other].update(target for target, score in matcher.scores(kind, id)
+                                   if score > floors.get(target, 0))
+
+    for kind in SIDES:
+        write_lists(matcher, kind, todo[kind], now, everything)
+    # only the marks read above: rows stamped again since then are newer
+    # than the data used here and stay for the next refresh
+    for chunk in chunked(marked):
+        db.session.execute(db.delete(StaleMatch).where(
+            db.tuple_(StaleMatch.kind, StaleMatch.id, StaleMatch.marked_at).in_([tuple(row) for row in chunk])))
+    keys = ['%s:%d' % (kind, id) for kind in SIDES for id in sorted(todo[kind])]
+    if keys:
+        bump_versions(*keys)
+    db.session.commit()
+
+    return len(keys)
+
+
+# ----------------------------------------------------------------------------#
+# Commands.
+# ----------------------------------------------------------------------------#
+@cli.command('refresh', help='Recompute the matches of changed venues and artists now.')
+def refresh_command():
+    click.echo('%d match lists recomputed' % refresh_matches())
+
+
+@cli.command('rebuild', help='Recompute every match list.')
+def rebuild_command():
+    click.echo('%d match lists recomputed' % refresh_matches(everything=True))
@@ -0,0 +1,32 @@
+"""convert Show.start_time to timestamp
+
+Revision ID: a3f1c2d4e5b6
+Revises: 0c0afc67d260
+Create Date: 2026-10-17 09:12:40.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f1c2d4e5b6'
+down_revision = '0c0afc67d260'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.alter_column('Show', 'start_time',
+               existing_type=sa.VARCHAR(),
+               type_=sa.DateTime(),
+               existing_nullable=False,
+               postgresql_using='start_time::timestamp without time zone')
+
+
+def downgrade():
+    op.alter_column('Show', 'start_time',
+               existing_type=sa.DateTime(),
+               type_=sa.VARCHAR(),
+               existing_nullable=False,
+               postgresql_using="to_char(start_time, 'YYYY-MM-DD HH24:MI:SS')")
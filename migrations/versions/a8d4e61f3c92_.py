@@ -0,0 +1,38 @@
+"""Show duration, booked time range and double booking exclusion constraints
+
+Revision ID: a8d4e61f3c92
+Revises: f2c86d0b5e17
+Create Date: 2026-10-17 16:08:44.271930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8d4e61f3c92'
+down_revision = 'f2c86d0b5e17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # integer equality inside a GiST index
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.add_column('Show', sa.Column('duration', sa.Integer(), server_default='120', nullable=False))
+    op.add_column('Show', sa.Column('during', postgresql.TSRANGE(),
+                                    sa.Computed("tsrange(start_time, start_time + duration * interval '1 minute')",
+                                                persisted=True), nullable=True))
+    # fails on existing double bookings, which have to be moved first
+    op.create_exclude_constraint('ex_Show_venue_id_during', 'Show', ('venue_id', '='), ('during', '&&'),
+                                 using='gist')
+    op.create_exclude_constraint('ex_Show_artist_id_during', 'Show', ('artist_id', '='), ('during', '&&'),
+                                 using='gist')
+
+
+def downgrade():
+    op.drop_constraint('ex_Show_artist_id_during', 'Show')
+    op.drop_constraint('ex_Show_venue_id_during', 'Show')
+    op.drop_column('Show', 'during')
+    op.drop_column('Show', 'duration')
@@ -0,0 +1,29 @@
+"""Version table for data change tracking
+
+Revision ID: c41d8e0a9f27
+Revises: b7e2d9c41f03
+Create Date: 2026-10-17 11:26:03.482190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41d8e0a9f27'
+down_revision = 'b7e2d9c41f03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('Version',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+
+
+def downgrade():
+    op.drop_table('Version')
@@ -0,0 +1,67 @@
+"""Normalized genres, GIN indexes on genres and the GenreStats count table
+
+Revision ID: c7f1e3a9d265
+Revises: a8d4e61f3c92
+Create Date: 2026-10-17 17:21:09.604118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7f1e3a9d265'
+down_revision = 'a8d4e61f3c92'
+branch_labels = None
+depends_on = None
+
+# genres.GENRES when this revision was written
+GENRES = ['Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk', 'Hip-Hop', 'Heavy Metal',
+          'Instrumental', 'Jazz', 'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul', 'Swing',
+          'Other']
+
+
+def upgrade():
+    # rewrite the stored genres as genres.normalize_genres would: split on
+    # commas, trimmed, spelled as the choices, deduplicated and in order
+    known = ', '.join("('%s', %d)" % (genre.replace("'", "''"), position) for position, genre in enumerate(GENRES))
+    for table in ('Venue', 'Artist'):
+        op.execute('''
+            UPDATE "{table}" t SET genres = coalesce((
+                SELECT array_agg(name ORDER BY position, name)
+                FROM (
+                    SELECT DISTINCT coalesce(k.name, btrim(s.part, ' {{}}"')) AS name,
+                                    coalesce(k.position, {other}) AS position
+                    FROM unnest(t.genres) AS g(genre)
+                         CROSS JOIN LATERAL regexp_split_to_table(g.genre, ',') AS s(part)
+                         LEFT JOIN (VALUES {known}) AS k(name, position)
+                                ON lower(k.name) = lower(btrim(s.part, ' {{}}"'))
+                    WHERE btrim(s.part, ' {{}}"') <> ''
+                ) n
+            ), '{{}}')
+            WHERE genres IS NOT NULL
+        '''.format(table=table, known=known, other=len(GENRES)))
+        op.create_index('ix_%s_genres' % table, table, ['genres'], unique=False, postgresql_using='gin')
+
+    op.create_table('GenreStats',
+    sa.Column('genre', sa.String(), nullable=False),
+    sa.Column('venues_count', sa.Integer(), nullable=False),
+    sa.Column('artists_count', sa.Integer(), nullable=False),
+    sa.Column('refreshed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('genre')
+    )
+    # backfill from the normalized rows
+    op.execute('''
+        INSERT INTO "GenreStats" (genre, venues_count, artists_count, refreshed_at)
+        SELECT genre, sum(venues), sum(artists), now()
+        FROM (SELECT unnest(genres) AS genre, 1 AS venues, 0 AS artists FROM "Venue"
+              UNION ALL
+              SELECT unnest(genres), 0, 1 FROM "Artist") g
+        GROUP BY genre
+    ''')
+
+
+def downgrade():
+    op.drop_table('GenreStats')
+    op.drop_index('ix_Artist_genres', table_name='Artist')
+    op.drop_index('ix_Venue_genres', table_name='Venue')
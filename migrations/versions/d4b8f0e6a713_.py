@@ -0,0 +1,30 @@
+"""Venue latitude/longitude and the GiST index on their location
+
+Revision ID: d4b8f0e6a713
+Revises: c7f1e3a9d265
+Create Date: 2026-10-17 18:02:47.115382
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4b8f0e6a713'
+down_revision = 'c7f1e3a9d265'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('Venue', sa.Column('longitude', sa.Float(), nullable=True))
+    # filled afterwards by "flask geo geocode"
+    op.create_index('ix_Venue_location', 'Venue', [sa.text('point(longitude, latitude)')], unique=False,
+                    postgresql_using='gist', postgresql_where=sa.text('latitude IS NOT NULL'))
+
+
+def downgrade():
+    op.drop_index('ix_Venue_location', table_name='Venue')
+    op.drop_column('Venue', 'longitude')
+    op.drop_column('Venue', 'latitude')
@@ -0,0 +1,26 @@
+"""indexes on Show (venue_id, start_time) and (artist_id, start_time)
+
+Revision ID: d93b6f1e2a58
+Revises: c41d8e0a9f27
+Create Date: 2026-10-17 12:40:55.907314
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd93b6f1e2a58'
+down_revision = 'c41d8e0a9f27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_Show_venue_id_start_time', table_name='Show')
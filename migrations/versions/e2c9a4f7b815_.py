@@ -0,0 +1,62 @@
+"""VenueMatch, ArtistMatch and StaleMatch recommendation tables
+
+Revision ID: e2c9a4f7b815
+Revises: d4b8f0e6a713
+Create Date: 2026-10-17 19:02:47.318255
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2c9a4f7b815'
+down_revision = 'd4b8f0e6a713'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('VenueMatch',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('venue_id', 'artist_id')
+    )
+    op.create_index('ix_VenueMatch_artist_id', 'VenueMatch', ['artist_id'], unique=False)
+    op.create_table('ArtistMatch',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('artist_id', 'venue_id')
+    )
+    op.create_index('ix_ArtistMatch_venue_id', 'ArtistMatch', ['venue_id'], unique=False)
+    op.create_table('StaleMatch',
+    sa.Column('kind', sa.String(length=6), nullable=False),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('marked_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('kind', 'id')
+    )
+    # the first "flask matches refresh" computes every seeking venue and artist
+    op.execute('''
+        INSERT INTO "StaleMatch" (kind, id, marked_at)
+        SELECT 'venue', id, now() FROM "Venue" WHERE seeking_talent
+        UNION ALL
+        SELECT 'artist', id, now() FROM "Artist" WHERE seeking_venue
+    ''')
+
+
+def downgrade():
+    op.drop_table('StaleMatch')
+    op.drop_index('ix_ArtistMatch_venue_id', table_name='ArtistMatch')
+    op.drop_table('ArtistMatch')
+    op.drop_index('ix_VenueMatch_artist_id', table_name='VenueMatch')
+    op.drop_table('VenueMatch')
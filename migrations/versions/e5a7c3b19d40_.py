@@ -0,0 +1,51 @@
+"""VenueStats and ArtistStats show count tables
+
+Revision ID: e5a7c3b19d40
+Revises: d93b6f1e2a58
+Create Date: 2026-10-17 14:02:31.518446
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a7c3b19d40'
+down_revision = 'd93b6f1e2a58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table, owner, key in (('VenueStats', 'Venue', 'venue_id'), ('ArtistStats', 'Artist', 'artist_id')):
+        op.create_table(table,
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('upcoming_shows_count', sa.Integer(), nullable=False),
+        sa.Column('past_shows_count', sa.Integer(), nullable=False),
+        sa.Column('next_show_time', sa.DateTime(), nullable=True),
+        sa.Column('last_show_time', sa.DateTime(), nullable=True),
+        sa.Column('refreshed_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['id'], [owner + '.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_%s_next_show_time' % table, table, ['next_show_time'], unique=False)
+        # backfill from the existing shows
+        op.execute('''
+            INSERT INTO "{table}" (id, upcoming_shows_count, past_shows_count,
+                                   next_show_time, last_show_time, refreshed_at)
+            SELECT o.id,
+                   count(s.id) FILTER (WHERE s.start_time > now()),
+                   count(s.id) FILTER (WHERE s.start_time <= now()),
+                   min(s.start_time) FILTER (WHERE s.start_time > now()),
+                   max(s.start_time) FILTER (WHERE s.start_time <= now()),
+                   now()
+            FROM "{owner}" o LEFT JOIN "Show" s ON s.{key} = o.id
+            GROUP BY o.id
+        '''.format(table=table, owner=owner, key=key))
+
+
+def downgrade():
+    op.drop_index('ix_ArtistStats_next_show_time', table_name='ArtistStats')
+    op.drop_table('ArtistStats')
+    op.drop_index('ix_VenueStats_next_show_time', table_name='VenueStats')
+    op.drop_table('VenueStats')
@@ -0,0 +1,30 @@
+"""indexes in the keyset order of the venue, artist and show listings
+
+Revision ID: f2c86d0b5e17
+Revises: e5a7c3b19d40
+Create Date: 2026-10-17 15:21:09.604127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c86d0b5e17'
+down_revision = 'e5a7c3b19d40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Venue_area_name_id', 'Venue',
+                    [sa.text("coalesce(city, '')"), sa.text("coalesce(state, '')"), sa.text("coalesce(name, '')"), 'id'],
+                    unique=False)
+    op.create_index('ix_Artist_name_id', 'Artist', [sa.text("coalesce(name, '')"), 'id'], unique=False)
+    op.create_index('ix_Show_start_time_id', 'Show', ['start_time', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Show_start_time_id', table_name='Show')
+    op.drop_index('ix_Artist_name_id', table_name='Artist')
+    op.drop_index('ix_Venue_area_name_id', table_name='Venue')
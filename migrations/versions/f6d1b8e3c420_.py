@@ -0,0 +1,47 @@
+"""Job queue table
+
+Revision ID: f6d1b8e3c420
+Revises: e2c9a4f7b815
+Create Date: 2026-10-17 20:11:38.502174
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6d1b8e3c420'
+down_revision = 'e2c9a4f7b815'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('Job',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('task', sa.String(length=64), nullable=False),
+    sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('key', sa.String(length=128), nullable=True),
+    sa.Column('status', sa.String(length=8), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('run_at', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('worker', sa.String(length=64), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_Job_queued_run_at', 'Job', ['run_at', 'id'], unique=False,
+                    postgresql_where=sa.text("status = 'queued'"))
+    op.create_index('ix_Job_queued_key', 'Job', ['key'], unique=True,
+                    postgresql_where=sa.text("status = 'queued' AND key IS NOT NULL"))
+    op.create_index('ix_Job_status_started_at', 'Job', ['status', 'started_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Job_status_started_at', table_name='Job')
+    op.drop_index('ix_Job_queued_key', table_name='Job')
+    op.drop_index('ix_Job_queued_run_at', table_name='Job')
+    op.drop_table('Job')
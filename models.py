@@ -1,56 +1,218 @@
-from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from datetime import datetime
+from sqlalchemy.dialects.postgresql import ExcludeConstraint, JSONB, TSRANGE
 
-# app configuration
-app = Flask(__name__)
-app.config.from_object('config')
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+# Bound to the app with db.init_app(app)
+db = SQLAlchemy()
 
-# models start here
+
+# ----------------------------------------------------------------------------#
+# Models.
+# ----------------------------------------------------------------------------#
 class Venue(db.Model):
     __tablename__ = 'Venue'
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
-    city = db.Column(db.String(120))
-    state = db.Column(db.String(120))
-    address = db.Column(db.String(120))
-    phone = db.Column(db.String(120))
-    image_link = db.Column(db.String(500))
-    facebook_link = db.Column(db.String(120))
-    # new fields
-    genres = db.Column(db.ARRAY(db.String))
-    website = db.Column(db.String(120))
-    seeking_talent = db.Column(db.Boolean)
-    seeking_description = db.Column(db.String(500))
+    name = db.Column(db.String(120), nullable=True, unique=True)
+    city = db.Column(db.String, nullable=True)
+    state = db.Column(db.String, nullable=True)
+    address = db.Column(db.String(120), nullable=True)
+    phone = db.Column(db.String(12), nullable=True)
+    genres = db.Column(db.ARRAY(db.String), nullable=True)
+    image_link = db.Column(db.String(255), nullable=True)
+    facebook_link = db.Column(db.String(255), nullable=True)
+    website = db.Column(db.String(255), nullable=True)
+    seeking_talent = db.Column(db.Boolean(), default=False)
+    seeking_description = db.Column(db.String(128), nullable=True)
+    # filled by "flask geo geocode", cleared when city or state change
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    shows = db.relationship('Show', backref='venue', lazy=True, passive_deletes=True)
+
+    __table_args__ = (
+        db.Index('ix_Venue_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        # keyset order of the /venues listing
+        db.Index('ix_Venue_area_name_id', db.func.coalesce(city, ''), db.func.coalesce(state, ''),
+                 db.func.coalesce(name, ''), id),
+        # genres @> ARRAY[...] of the ?genre= filter and GenreStats refreshes
+        db.Index('ix_Venue_genres', 'genres', postgresql_using='gin'),
+        # box containment and KNN (<->) lookups of geo.GistNearby
+        db.Index('ix_Venue_location', db.func.point(longitude, latitude), postgresql_using='gist',
+                 postgresql_where=latitude.isnot(None)),
+    )
 
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
-    city = db.Column(db.String(120))
-    state = db.Column(db.String(120))
-    phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
-    image_link = db.Column(db.String(500))
-    facebook_link = db.Column(db.String(120))
-    # new fields
-    website = db.Column(db.String(120))
-    seeking_venue = db.Column(db.Boolean)
-    seeking_description = db.Column(db.String(500))
-
-# created db table Show
+    name = db.Column(db.String(120), nullable=True, unique=True)
+    city = db.Column(db.String, nullable=True)
+    state = db.Column(db.String, nullable=True)
+    phone = db.Column(db.String(12), nullable=True)
+    genres = db.Column(db.ARRAY(db.String), nullable=True)
+    image_link = db.Column(db.String(255), nullable=True)
+    facebook_link = db.Column(db.String(255), nullable=True)
+    website = db.Column(db.String(255), nullable=True)
+    seeking_venue = db.Column(db.Boolean(), default=False)
+    seeking_description = db.Column(db.String(255), nullable=True)
+    shows = db.relationship('Show', backref='artist', lazy=True, passive_deletes=True)
+
+    __table_args__ = (
+        db.Index('ix_Artist_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        # keyset order of the /artists listing
+        db.Index('ix_Artist_name_id', db.func.coalesce(name, ''), id),
+        db.Index('ix_Artist_genres', 'genres', postgresql_using='gin'),
+    )
+
+
 class Show(db.Model):
     __tablename__ = 'Show'
+
+    id = db.Column(db.Integer, primary_key=True)
+    venue_id = db.Column(db.Integer, db.ForeignKey(Venue.id, ondelete='CASCADE'), nullable=False)
+    artist_id = db.Column(db.Integer, db.ForeignKey(Artist.id, ondelete='CASCADE'), nullable=False)
+    start_time = db.Column(db.DateTime(), nullable=False)
+    # minutes
+    duration = db.Column(db.Integer, nullable=False, default=120, server_default='120')
+    # [start_time, start_time + duration), kept by the database
+    during = db.Column(TSRANGE, db.Computed("tsrange(start_time, start_time + duration * interval '1 minute')",
+                                            persisted=True))
+
+    # every page reads the shows of one venue or artist split around now
+    __table_args__ = (
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        # keyset order of the unfiltered /shows feed
+        db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+        # no double bookings; the GiST indexes behind these also answer the
+        # overlap lookups of shows.find_conflicts
+        ExcludeConstraint(('venue_id', '='), ('during', '&&'), using='gist', name='ex_Show_venue_id_during'),
+        ExcludeConstraint(('artist_id', '='), ('during', '&&'), using='gist', name='ex_Show_artist_id_during'),
+    )
+
+
+class VenueStats(db.Model):
+    # Show counts of one venue, maintained by stats.refresh_stats so listings
+    # and searches do not count Show rows on every request
+    __tablename__ = 'VenueStats'
+
+    id = db.Column(db.Integer, db.ForeignKey(Venue.id, ondelete='CASCADE'), primary_key=True)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0)
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0)
+    next_show_time = db.Column(db.DateTime(), nullable=True)
+    last_show_time = db.Column(db.DateTime(), nullable=True)
+    refreshed_at = db.Column(db.DateTime(), nullable=False)
+
+    # rows whose next show has started are found by the periodic roll over
+    __table_args__ = (
+        db.Index('ix_VenueStats_next_show_time', 'next_show_time'),
+    )
+
+
+class ArtistStats(db.Model):
+    # Show counts of one artist, see VenueStats
+    __tablename__ = 'ArtistStats'
+
+    id = db.Column(db.Integer, db.ForeignKey(Artist.id, ondelete='CASCADE'), primary_key=True)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0)
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0)
+    next_show_time = db.Column(db.DateTime(), nullable=True)
+    last_show_time = db.Column(db.DateTime(), nullable=True)
+    refreshed_at = db.Column(db.DateTime(), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_ArtistStats_next_show_time', 'next_show_time'),
+    )
+
+
+class VenueMatch(db.Model):
+    # Top artists recommended to a venue seeking talent, best first, kept by
+    # matches.refresh_matches so pages never score pairs
+    __tablename__ = 'VenueMatch'
+
+    venue_id = db.Column(db.Integer, db.ForeignKey(Venue.id, ondelete='CASCADE'), primary_key=True)
+    artist_id = db.Column(db.Integer, db.ForeignKey(Artist.id, ondelete='CASCADE'), primary_key=True)
+    rank = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime(), nullable=False)
+
+    # the venues listing an artist, whose lists change with its profile
+    __table_args__ = (
+        db.Index('ix_VenueMatch_artist_id', 'artist_id'),
+    )
+
+
+class ArtistMatch(db.Model):
+    # Top venues recommended to an artist seeking a venue, see VenueMatch
+    __tablename__ = 'ArtistMatch'
+
+    artist_id = db.Column(db.Integer, db.ForeignKey(Artist.id, ondelete='CASCADE'), primary_key=True)
+    venue_id = db.Column(db.Integer, db.ForeignKey(Venue.id, ondelete='CASCADE'), primary_key=True)
+    rank = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime(), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_ArtistMatch_venue_id', 'venue_id'),
+    )
+
+
+class StaleMatch(db.Model):
+    # Venues and artists whose profile or show history changed since their
+    # matches were computed, marked in the transaction of the change
+    __tablename__ = 'StaleMatch'
+
+    kind = db.Column(db.String(6), primary_key=True)
     id = db.Column(db.Integer, primary_key=True)
-    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'))
-    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'))
-    start_time = db.Column(db.DateTime, nullable=False)
+    marked_at = db.Column(db.DateTime(), nullable=False)
+
+
+class GenreStats(db.Model):
+    # Venues and artists listing one genre, maintained by
+    # stats.refresh_genre_stats for the genre filters of the listings
+    __tablename__ = 'GenreStats'
+
+    genre = db.Column(db.String, primary_key=True)
+    venues_count = db.Column(db.Integer, nullable=False, default=0)
+    artists_count = db.Column(db.Integer, nullable=False, default=0)
+    refreshed_at = db.Column(db.DateTime(), nullable=False)
+
+
+class Version(db.Model):
+    # Change counter of a table ('Venue') or of a page ('venue:1'), bumped in
+    # the same transaction as the write it tracks
+    __tablename__ = 'Version'
+
+    key = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime(), nullable=False)
+
+
+class Job(db.Model):
+    # Background work queued by the write handlers in their own transaction
+    # and run by jobs.Worker threads; `key` coalesces queued duplicates
+    __tablename__ = 'Job'
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    task = db.Column(db.String(64), nullable=False)
+    payload = db.Column(JSONB, nullable=False)
+    key = db.Column(db.String(128), nullable=True)
+    # queued, running, done or failed
+    status = db.Column(db.String(8), nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_at = db.Column(db.DateTime(), nullable=False)
+    created_at = db.Column(db.DateTime(), nullable=False)
+    started_at = db.Column(db.DateTime(), nullable=True)
+    finished_at = db.Column(db.DateTime(), nullable=True)
+    worker = db.Column(db.String(64), nullable=True)
+    error = db.Column(db.Text, nullable=True)
 
-# commit all the changes
-db.create_all()
\ No newline at end of file
+    __table_args__ = (
+        # the due jobs, claimed oldest first
+        db.Index('ix_Job_queued_run_at', 'run_at', 'id', postgresql_where=status == 'queued'),
+        # one queued job per key
+        db.Index('ix_Job_queued_key', 'key', unique=True,
+                 postgresql_where=db.and_(status == 'queued', key.isnot(None))),
+        # stuck running jobs, and purging finished ones
+        db.Index('ix_Job_status_started_at', 'status', 'started_at'),
+    )
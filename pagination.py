@@ -0,0 +1,79 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+
+# ----------------------------------------------------------------------------#
+# Keyset cursors.
+# ----------------------------------------------------------------------------#
+# A cursor is the sort key of the last row of a page, serialized into an
+# opaque url-safe token. Datetimes are tagged so they decode back to datetimes.
+def encode_cursor(values):
+    values = [{'dt': value.isoformat()} if isinstance(value, datetime) else value for value in values]
+    token = base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode())
+
+    return token.decode().rstrip('=')
+
+
+def decode_cursor(token, length):
+    # Return the decoded sort key of `length` values, or None for a missing
+    # or malformed token
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        values = tuple(
+            datetime.fromisoformat(value['dt']) if isinstance(value, dict) else value for value in values
+        )
+    except (ValueError, TypeError, KeyError):
+        return None
+
+    return values if len(values) == length else None
+
+
+# ----------------------------------------------------------------------------#
+# Keyset pages.
+# ----------------------------------------------------------------------------#
+class Page(object):
+    # One page of items with the cursors of the pages around it, None at
+    # either end of the listing
+
+    def __init__(self, items, next=None, prev=None):
+        self.items = items
+        self.next = next
+        self.prev = prev
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+def keyset_page(query, keys, after=None, before=None, limit=50):
+    # Fetch the page of `query` following the `after` key, or preceding the
+    # `before` key. `keys` are the sort columns, ascending and unique taken
+    # together (end them with the id), and rows must carry them under the
+    # same names. At most limit + 1 rows are read, whatever the table size.
+    names = [key.key for key in keys]
+    if before is not None:
+        rows = query.filter(tuple_(*keys) < before) \
+            .order_by(*[key.desc() for key in keys]) \
+            .limit(limit + 1) \
+            .all()
+        more_before, more_after = len(rows) > limit, True
+        rows = rows[:limit][::-1]
+    else:
+        if after is not None:
+            query = query.filter(tuple_(*keys) > after)
+        rows = query.order_by(*keys).limit(limit + 1).all()
+        more_before, more_after = after is not None, len(rows) > limit
+        rows = rows[:limit]
+    if not rows:
+        return Page([])
+
+    def cursor(row):
+        return encode_cursor([getattr(row, name) for name in names])
+
+    return Page(rows,
+                next=cursor(rows[-1]) if more_after else None,
+                prev=cursor(rows[0]) if more_before else None)
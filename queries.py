@@ -0,0 +1,269 @@
+from datetime import datetime, timedelta
+from itertools import groupby
+
+from genres import has_genre
+from jobs import task
+from models import db, Venue, Artist, Show, VenueStats, VenueMatch, ArtistMatch
+from pagination import Page, encode_cursor, keyset_page
+from versions import bump_versions
+
+
+# ----------------------------------------------------------------------------#
+# Page queries.
+# ----------------------------------------------------------------------------#
+def venue_areas(after=None, before=None, limit=100, genre=None):
+    # One page of the city, state -> venues -> upcoming shows tree. Venues are
+    # paged in (city, state, name, id) order and grouped into areas, with the
+    # counts read from VenueStats instead of counting Show rows. `genre`
+    # keeps the venues listing it.
+    keys = [
+        db.func.coalesce(Venue.city, '').label('city'),
+        db.func.coalesce(Venue.state, '').label('state'),
+        db.func.coalesce(Venue.name, '').label('name'),
+        Venue.id
+    ]
+    query = db.session.query(*keys, db.func.coalesce(VenueStats.upcoming_shows_count, 0).label('upcoming')) \
+        .outerjoin(VenueStats, VenueStats.id == Venue.id)
+    if genre:
+        query = query.filter(has_genre(Venue, genre))
+    page = keyset_page(query, keys, after=after, before=before, limit=limit)
+
+    areas = []
+    for (city, state), area_rows in groupby(page, key=lambda row: (row.city, row.state)):
+        areas.append({
+            'city'  : city,
+            'state' : state,
+            'venues': [{
+                'id'                : row.id,
+                'name'              : row.name,
+                'num_upcoming_shows': row.upcoming
+            } for row in area_rows]
+        })
+
+    return Page(areas, next=page.next, prev=page.prev)
+
+
+def artist_list(after=None, before=None, limit=100, genre=None):
+    # One page of artists in (name, id) order, of one genre if given
+    keys = [db.func.coalesce(Artist.name, '').label('name'), Artist.id]
+    query = db.session.query(*keys)
+    if genre:
+        query = query.filter(has_genre(Artist, genre))
+    page = keyset_page(query, keys, after=after, before=before, limit=limit)
+
+    return Page([{
+        "id"  : row.id,
+        "name": row.name
+    } for row in page], next=page.next, prev=page.prev)
+
+
+def venue_page(venue_id):
+    # Data for pages/show_venue.html, or None if there is no such venue
+    venue = Venue.query.get(venue_id)
+    if not venue:
+        return None
+    data = {
+        "id"                  : venue_id,
+        "name"                : venue.name,
+        "genres"              : venue.genres,
+        "address"             : venue.address,
+        "city"                : venue.city,
+        "state"               : venue.state,
+        "phone"               : venue.phone,
+        "website"             : venue.website,
+        "facebook_link"       : venue.facebook_link,
+        "seeking_talent"      : venue.seeking_talent,
+        "seeking_description" : venue.seeking_description,
+        "image_link"          : venue.image_link,
+    }
+    data.update(show_timeline(venue_id=venue_id))
+    data['recommended_artists'] = recommended(venue_id=venue_id) if venue.seeking_talent else []
+
+    return data
+
+
+def artist_page(artist_id):
+    # Data for pages/show_artist.html, or None if there is no such artist
+    artist = Artist.query.get(artist_id)
+    if not artist:
+        return None
+    data = {
+        "id"                  : artist_id,
+        "name"                : artist.name,
+        "genres"              : artist.genres,
+        "city"                : artist.city,
+        "state"               : artist.state,
+        "phone"               : artist.phone,
+        "website"             : artist.website,
+        "facebook_link"       : artist.facebook_link,
+        "seeking_venue"       : artist.seeking_venue,
+        "seeking_description" : artist.seeking_description,
+        "image_link"          : artist.image_link,
+    }
+    data.update(show_timeline(artist_id=artist_id))
+    data['recommended_venues'] = recommended(artist_id=artist_id) if artist.seeking_venue else []
+
+    return data
+
+
+def stamp(data, version):
+    # Page data with the version of its Version row when it was read, which
+    # keys the fragment rendered from it; None stays None
+    if data is not None:
+        data['version'] = version
+    return data
+
+
+def page_keys(venue_id=None, artist_id=None):
+    # Cache keys of a venue (or artist) page and of the artist (or venue)
+    # pages showing its name and image next to a shared show
+    if venue_id is not None:
+        others = db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()
+        return ['venue:%d' % venue_id] + ['artist:%d' % id for id, in others]
+    others = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()
+    return ['artist:%d' % artist_id] + ['venue:%d' % id for id, in others]
+
+
+@task('linked_pages')
+def refresh_linked_pages(venue_id=None, artist_id=None):
+    # After an edit, off the request: the artist (or venue) pages showing the
+    # edited venue (or artist) next to a shared show are bumped, which
+    # retires their page cache entries. The edited page itself is handled
+    # inline.
+    keys = page_keys(venue_id=venue_id, artist_id=artist_id)[1:]
+    if keys:
+        bump_versions(*keys)
+        db.session.commit()
+
+
+def show_timeline(venue_id=None, artist_id=None):
+    # Past and upcoming shows of one venue (joined with their artists) or one
+    # artist (joined with their venues), split against a single `now`.
+    if venue_id is not None:
+        prefix = 'artist'
+        shows = db.session.query(Show.start_time, Artist.id, Artist.name, Artist.image_link) \
+            .join(Artist, Show.artist_id == Artist.id) \
+            .filter(Show.venue_id == venue_id)
+    else:
+        prefix = 'venue'
+        shows = db.session.query(Show.start_time, Venue.id, Venue.name, Venue.image_link) \
+            .join(Venue, Show.venue_id == Venue.id) \
+            .filter(Show.artist_id == artist_id)
+
+    now = datetime.now()
+    timeline = {
+        'past_shows'    : [],
+        'upcoming_shows': []
+    }
+    for start_time, id, name, image_link in shows.order_by(Show.start_time).all():
+        show = {
+            prefix + '_id'        : id,
+            prefix + '_name'      : name,
+            prefix + '_image_link': image_link,
+            'start_time'          : start_time
+        }
+        timeline['upcoming_shows' if start_time > now else 'past_shows'].append(show)
+    timeline['past_shows_count'] = len(timeline['past_shows'])
+    timeline['upcoming_shows_count'] = len(timeline['upcoming_shows'])
+
+    return timeline
+
+
+def recommended(venue_id=None, artist_id=None):
+    # The precomputed matches of one venue (joined with their artists) or one
+    # artist (joined with their venues), best first. The refresh_matches job
+    # keeps them current, so nothing is scored here.
+    if venue_id is not None:
+        prefix = 'artist'
+        matches = db.session.query(Artist.id, Artist.name, Artist.image_link) \
+            .join(VenueMatch, VenueMatch.artist_id == Artist.id) \
+            .filter(VenueMatch.venue_id == venue_id) \
+            .order_by(VenueMatch.rank)
+    else:
+        prefix = 'venue'
+        matches = db.session.query(Venue.id, Venue.name, Venue.image_link) \
+            .join(ArtistMatch, ArtistMatch.venue_id == Venue.id) \
+            .filter(ArtistMatch.artist_id == artist_id) \
+            .order_by(ArtistMatch.rank)
+
+    return [{
+        prefix + '_id'        : id,
+        prefix + '_name'      : name,
+        prefix + '_image_link': image_link
+    } for id, name, image_link in matches.all()]
+
+
+class ShowFeed(object):
+    # One page of the /shows feed, rendered straight from the database cursor.
+    # `next` and `prev` hold the cursors of the pages around it once
+    # iteration is done. Pages reached backwards come in reverse order and
+    # are turned around in memory, which holds at most limit + 1 rows.
+
+    def __init__(self, rows, limit, after=None, before=None):
+        self.rows = rows
+        self.limit = limit
+        self.backwards = before is not None
+        self.more_before = after is not None
+        self.next = None
+        self.prev = None
+
+    def __iter__(self):
+        rows = self.rows
+        if self.backwards:
+            rows = list(rows)
+            self.more_before = len(rows) > self.limit
+            rows = rows[:self.limit][::-1]
+        first = last = None
+        for count, row in enumerate(rows):
+            if count == self.limit:
+                self.next = encode_cursor([last.start_time, last.id])
+                break
+            first = first or row
+            last = row
+            yield {
+                'venue_id'         : row.venue_id,
+                'venue_name'       : row.venue_name,
+                'artist_id'        : row.artist_id,
+                'artist_name'      : row.artist_name,
+                'artist_image_link': row.artist_image_link,
+                'start_time'       : row.start_time
+            }
+        if last is not None and self.backwards:
+            self.next = encode_cursor([last.start_time, last.id])
+        if first is not None and self.more_before:
+            self.prev = encode_cursor([first.start_time, first.id])
+
+
+def show_feed(after=None, before=None, venue_id=None, artist_id=None, start=None, end=None, limit=50):
+    # Shows joined with their venue and artist in one statement, ordered by
+    # (start_time, id) and resumed after the `after` key of the previous page,
+    # or before the `before` key of the next one
+    query = db.session.query(
+        Show.id,
+        Show.start_time,
+        Venue.id.label('venue_id'),
+        Venue.name.label('venue_name'),
+        Artist.id.label('artist_id'),
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')
+    ).join(Venue, Show.venue_id == Venue.id) \
+        .join(Artist, Show.artist_id == Artist.id)
+    if venue_id is not None:
+        query = query.filter(Show.venue_id == venue_id)
+    if artist_id is not None:
+        query = query.filter(Show.artist_id == artist_id)
+    if start is not None:
+        query = query.filter(Show.start_time >= start)
+    if end is not None:
+        query = query.filter(Show.start_time < end + timedelta(days=1))
+    if before is not None:
+        query = query.filter(db.tuple_(Show.start_time, Show.id) < before) \
+            .order_by(Show.start_time.desc(), Show.id.desc())
+    else:
+        if after is not None:
+            query = query.filter(db.tuple_(Show.start_time, Show.id) > after)
+        query = query.order_by(Show.start_time, Show.id)
+    # one extra row tells whether there is a page beyond this one
+    rows = query.limit(limit + 1).yield_per(100)
+
+    return ShowFeed(rows, limit, after=after, before=before)
@@ -0,0 +1,275 @@
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+
+from pagination import keyset_page
+
+
+# ----------------------------------------------------------------------------#
+# Search backends.
+# ----------------------------------------------------------------------------#
+class LikeSearch(object):
+    # Portable name search: case insensitive substring match, prefix matches
+    # ranked first. Used for SQLite and other non PostgreSQL databases.
+
+    def __init__(self, db):
+        self.db = db
+
+    def match(self, model, term):
+        return self.db.func.lower(model.name).like('%' + escape_like(term.lower()) + '%', escape='\\')
+
+    def rank(self, model, term):
+        # ascending: prefix matches first
+        prefix = self.db.func.lower(model.name).like(escape_like(term.lower()) + '%', escape='\\')
+        return self.db.case((prefix, 0), else_=1)
+
+    def search(self, model, stats, term, after=None, before=None, per_page=20):
+        # Return {'count', 'data', 'next', 'prev', 'per_page'} for one page of
+        # matches, paged by (rank, name, id) keyset cursors. `stats` is the
+        # counts table of `model`, e.g. VenueStats. The number of upcoming
+        # shows and the total number of matches come back with the page
+        # itself, in one statement.
+        db = self.db
+        matches = db.session.query(
+            model.id,
+            model.name,
+            db.func.coalesce(stats.upcoming_shows_count, 0).label('num_upcoming_shows'),
+            self.rank(model, term).label('rank'),
+            db.func.count().over().label('total')
+        ).outerjoin(stats, stats.id == model.id) \
+            .filter(self.match(model, term)) \
+            .subquery()
+        page = keyset_page(db.session.query(matches),
+                           [matches.c.rank, matches.c.name, matches.c.id],
+                           after=after, before=before, limit=per_page)
+
+        return {
+            'count'   : page.items[0].total if page.items else 0,
+            'next'    : page.next,
+            'prev'    : page.prev,
+            'per_page': per_page,
+            'data'    : [{
+                'id'                : row.id,
+                'name'              : row.name,
+                'num_upcoming_shows': row.num_upcoming_shows
+            } for row in page]
+        }
+
+
+class TrigramSearch(LikeSearch):
+    # PostgreSQL search: ILIKE served by the pg_trgm GIN indexes on the name
+    # columns, ranked by trigram similarity to the search term.
+
+    def match(self, model, term):
+        return model.name.ilike('%' + escape_like(term) + '%', escape='\\')
+
+    def rank(self, model, term):
+        # negated so that the most similar names sort first in ascending order.
+        # similarity() is a float4, which does not survive the round trip
+        # through a JSON cursor, so it is scaled to an integer.
+        db = self.db
+        return -db.cast(db.func.round(db.func.similarity(model.name, term) * 1000000), db.Integer)
+
+
+def escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_backend(config, db):
+    # Pick the backend from SEARCH_BACKEND, or from the database URI when unset
+    backend = config.get('SEARCH_BACKEND')
+    if backend is None:
+        uri = config.get('SQLALCHEMY_DATABASE_URI', '')
+        backend = 'trigram' if uri.startswith('postgres') else 'like'
+    backends = {
+        'trigram': TrigramSearch,
+        'like'   : LikeSearch,
+    }
+
+    return backends[backend](db)
+
+
+# ----------------------------------------------------------------------------#
+# Typeahead index.
+# ----------------------------------------------------------------------------#
+class NameIndex(object):
+    # In-memory trigram/prefix index over the names of one table, answering
+    # typeahead queries without a database round trip.
+    #
+    # Terms of three characters or more are looked up through trigram posting
+    # lists (sorted arrays of ids), shorter ones through a sorted list of word
+    # prefixes. Names are interned and postings are kept in typed arrays to
+    # keep the footprint small. The index is loaded lazily with `loader`, a
+    # callable returning (id, name) pairs, and reloaded after `max_age`
+    # seconds so that writes from other workers show up eventually.
+
+    def __init__(self, loader, max_age=300):
+        self.loader = loader
+        self.max_age = max_age
+        self.loaded_at = None
+        self.lock = threading.RLock()
+        self.names = {}
+        self.grams = {}
+        self.words = []
+
+    def load(self):
+        with self.lock:
+            self.names = {}
+            self.grams = {}
+            self.words = []
+            for id, name in self.loader():
+                self._add(id, name)
+            self.words.sort()
+            self.loaded_at = time.monotonic()
+
+    def ensure_loaded(self):
+        if self.loaded_at is None or time.monotonic() - self.loaded_at > self.max_age:
+            self.load()
+
+    def add(self, id, name):
+        # Insert or rename an entry. Skipped until the index is first loaded,
+        # the load picks the row up from the database.
+        with self.lock:
+            if self.loaded_at is None:
+                return
+            self.remove(id)
+            self._add(id, name, keep_sorted=True)
+
+    def remove(self, id):
+        with self.lock:
+            name = self.names.pop(id, None)
+            if name is None:
+                return
+            lowered = name.lower()
+            for gram in trigrams(lowered):
+                postings = self.grams[gram]
+                i = bisect_left(postings, id)
+                if i < len(postings) and postings[i] == id:
+                    del postings[i]
+                if not postings:
+                    del self.grams[gram]
+            for word in set(lowered.split()):
+                i = bisect_left(self.words, (word, id))
+                if i < len(self.words) and self.words[i] == (word, id):
+                    del self.words[i]
+
+    def query(self, term, limit=10):
+        # Return up to `limit` {'id', 'name'} dicts, prefix matches first
+        self.ensure_loaded()
+        term = term.strip().lower()
+        if not term:
+            return []
+        with self.lock:
+            if len(term) < 3:
+                ids = self._word_prefix(term)
+            else:
+                ids = self._substring(term)
+            matches = sorted(
+                ((not self.names[id].lower().startswith(term), self.names[id], id) for id in ids)
+            )
+
+        return [{'id': id, 'name': name} for _, name, id in matches[:limit]]
+
+    def _add(self, id, name, keep_sorted=False):
+        if not name:
+            return
+        name = sys.intern(name)
+        self.names[id] = name
+        lowered = name.lower()
+        for gram in trigrams(lowered):
+            postings = self.grams.get(gram)
+            if postings is None:
+                postings = self.grams[gram] = array('l')
+            if keep_sorted or (postings and postings[-1] > id):
+                postings.insert(bisect_left(postings, id), id)
+            else:
+                postings.append(id)
+        for word in set(lowered.split()):
+            entry = (sys.intern(word), id)
+            if keep_sorted:
+                insort(self.words, entry)
+            else:
+                self.words.append(entry)
+
+    def _word_prefix(self, term):
+        ids = set()
+        i = bisect_left(self.words, (term,))
+        while i < len(self.words) and self.words[i][0].startswith(term):
+            ids.add(self.words[i][1])
+            i += 1
+
+        return ids
+
+    def _substring(self, term):
+        postings = []
+        for gram in trigrams(term):
+            if gram not in self.grams:
+                return set()
+            postings.append(self.grams[gram])
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for other in postings[1:]:
+            candidates.intersection_update(other)
+            if not candidates:
+                break
+        # trigrams only narrow the candidates down, confirm the real match
+        return {id for id in candidates if term in self.names[id].lower()}
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+# ----------------------------------------------------------------------------#
+# Select choices.
+# ----------------------------------------------------------------------------#
+class ChoiceCache(object):
+    # 'ID: n - name' select labels of one table, built from its NameIndex and
+    # kept in step with the version of the table's names: `version` returns
+    # the current version, and when it has moved (a name written in any
+    # worker) the index and labels are reloaded on next use. Serves the remote select
+    # lookups and the id checks of submitted forms.
+
+    def __init__(self, index, version):
+        self.index = index
+        self.version = version
+        self.loaded_version = None
+        self.lock = threading.Lock()
+        self.labels = {}
+        self.ordered = []
+
+    def ensure_current(self):
+        version = self.version()
+        with self.lock:
+            if version != self.loaded_version:
+                self.index.load()
+                names = dict(self.index.names)
+                self.labels = {id: 'ID: %d - %s' % (id, name) for id, name in names.items()}
+                self.ordered = sorted(names, key=lambda id: (names[id].lower(), id))
+                self.loaded_version = version
+
+    def __contains__(self, id):
+        self.ensure_current()
+        return id in self.labels
+
+    def label(self, id):
+        self.ensure_current()
+        return self.labels.get(id)
+
+    def query(self, term, limit=20):
+        # Return up to `limit` {'id', 'text'} dicts: an exact id first, then
+        # name matches from the index, or the first names when `term` is empty
+        self.ensure_current()
+        term = term.strip()
+        if term.isdigit() and int(term) in self.labels:
+            ids = [int(term)]
+        else:
+            ids = []
+        if term:
+            ids += [match['id'] for match in self.index.query(term, limit) if match['id'] not in ids]
+        else:
+            ids = self.ordered[:limit]
+
+        return [{'id': id, 'text': self.labels[id]} for id in ids[:limit] if id in self.labels]
@@ -0,0 +1,48 @@
+from flask import current_app
+from werkzeug.local import LocalProxy
+
+from cache import cache_backend
+from geo import nearby_backend
+from models import db, Venue, Artist
+from search import search_backend, ChoiceCache, NameIndex
+from versions import current_versions
+
+
+# ----------------------------------------------------------------------------#
+# Per-app services.
+# ----------------------------------------------------------------------------#
+def init_app(app):
+    # Name search backend for venues and artists
+    app.extensions['search'] = search_backend(app.config, db)
+
+    # "Venues near me" lookups
+    app.extensions['nearby'] = nearby_backend(app.config, db)
+
+    # In-memory typeahead indexes, kept current by the write handlers
+    app.extensions['venue_index'] = NameIndex(
+        lambda: db.session.query(Venue.id, Venue.name).order_by(Venue.id).all(),
+        max_age=app.config['TYPEAHEAD_MAX_AGE'])
+    app.extensions['artist_index'] = NameIndex(
+        lambda: db.session.query(Artist.id, Artist.name).order_by(Artist.id).all(),
+        max_age=app.config['TYPEAHEAD_MAX_AGE'])
+
+    # ShowForm select choices, reloaded when a name is added, renamed or
+    # removed. Those writes bump VenueNames/ArtistNames, which unlike the
+    # Venue/Artist versions are left alone by genre, stats and geo updates.
+    app.extensions['venue_choices'] = ChoiceCache(
+        app.extensions['venue_index'], lambda: current_versions('VenueNames')['VenueNames'])
+    app.extensions['artist_choices'] = ChoiceCache(
+        app.extensions['artist_index'], lambda: current_versions('ArtistNames')['ArtistNames'])
+
+    # Assembled venue/artist page data, keyed on the page versions
+    app.extensions['page_cache'] = cache_backend(app.config)
+
+
+# The services of the current app, for use inside requests
+search = LocalProxy(lambda: current_app.extensions['search'])
+nearby = LocalProxy(lambda: current_app.extensions['nearby'])
+venue_index = LocalProxy(lambda: current_app.extensions['venue_index'])
+artist_index = LocalProxy(lambda: current_app.extensions['artist_index'])
+page_cache = LocalProxy(lambda: current_app.extensions['page_cache'])
+venue_choices = LocalProxy(lambda: current_app.extensions['venue_choices'])
+artist_choices = LocalProxy(lambda: current_app.extensions['artist_choices'])
@@ -0,0 +1,132 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+from datetime import datetime, timedelta
+
+from flask import Blueprint, current_app, render_template, request, flash, redirect, url_for, jsonify
+
+from jobs import enqueue
+from matches import mark_stale
+from models import db, Venue, Artist, Show
+from pagination import decode_cursor
+from queries import show_feed
+from services import venue_choices, artist_choices
+from versions import bump_versions, conditional, current_versions
+
+bp = Blueprint('shows', __name__)
+
+
+#  Shows
+#  ----------------------------------------------------------------
+@bp.route('/shows')
+@conditional('Show', 'Venue', 'Artist')
+def shows():
+    # displays list of shows at /shows, one page at a time, optionally
+    # filtered by venue_id, artist_id and a from/to date range (YYYY-MM-DD)
+    filters = {
+        'venue_id' : request.args.get('venue_id', type=int),
+        'artist_id': request.args.get('artist_id', type=int),
+        'from'     : request.args.get('from', type=parse_date),
+        'to'       : request.args.get('to', type=parse_date),
+    }
+    feed = show_feed(after=decode_cursor(request.args.get('after'), 2),
+                     before=decode_cursor(request.args.get('before'), 2),
+                     venue_id=filters['venue_id'],
+                     artist_id=filters['artist_id'],
+                     start=filters['from'],
+                     end=filters['to'],
+                     limit=current_app.config['SHOWS_PAGE_SIZE'])
+    filters = {
+        key: value.strftime('%Y-%m-%d') if isinstance(value, datetime) else value
+        for key, value in filters.items() if value is not None
+    }
+
+    return render_template('pages/shows.html', shows=feed, filters=filters,
+                           versions=current_versions('Show', 'Venue', 'Artist'))
+
+
+@bp.route('/shows/create', methods=['GET'])
+def create_shows():
+    from forms import ShowForm
+
+    # the selects only hold their current option, the rest are looked up
+    # through shows.show_choices as the user types
+    form = ShowForm()
+    return render_show_form(form)
+
+
+def render_show_form(form):
+    for field, cache in ((form.artist_id, artist_choices), (form.venue_id, venue_choices)):
+        label = cache.label(field.data) if field.data else None
+        field.choices = [(field.data, label)] if label else []
+
+    return render_template('forms/new_show.html', form=form)
+
+
+@bp.route('/shows/choices/<any(venues, artists):kind>')
+def show_choices(kind):
+    # JSON options for the remote selects of the new show form, answered
+    # from the choice caches
+    cache = venue_choices if kind == 'venues' else artist_choices
+    return jsonify({
+        'results': cache.query(request.args.get('q', ''),
+                               limit=min(request.args.get('limit', 20, type=int), 50))
+    })
+
+
+@bp.route('/shows/create', methods=['POST'])
+def create_show_submission():
+    # called to create new shows in the db, upon submitting new show listing form
+    from forms import ShowForm
+
+    error = False
+    form = ShowForm()
+    if not form.validate():
+        flash('An error occurred. Show could not be listed.', 'error')
+        return render_show_form(form)
+    conflicts = find_conflicts(form.venue_id.data, form.artist_id.data, form.start_time.data, form.duration.data)
+    if conflicts:
+        flash('Show could not be listed: the %s is already booked at that time.' % ' and the '.join(conflicts),
+              'error')
+        return render_show_form(form)
+    try:
+        create_show = Show(
+            artist_id=form.artist_id.data,
+            venue_id=form.venue_id.data,
+            start_time=form.start_time.data,
+            duration=form.duration.data
+        )
+        db.session.add(create_show)
+        enqueue('show_stats', venue_ids=[int(form.venue_id.data)], artist_ids=[int(form.artist_id.data)])
+        mark_stale(venue_ids=[int(form.venue_id.data)], artist_ids=[int(form.artist_id.data)])
+        keys = ['venue:%d' % int(form.venue_id.data), 'artist:%d' % int(form.artist_id.data)]
+        bump_versions('Show', *keys)
+        db.session.commit()
+    except:
+        error = True
+        db.session.rollback()
+    if error:
+        # on error, flash error message
+        flash('An error occurred. Show could not be listed.', 'error')
+    else:
+        # on successful db insert, flash success
+        flash('Show was successfully listed!', 'success')
+
+    return redirect(url_for('shows.shows'))
+
+
+def find_conflicts(venue_id, artist_id, start_time, duration):
+    # 'venue' and/or 'artist' when a show of theirs overlaps the new one. One
+    # lookup in each exclusion constraint's GiST index; the constraints still
+    # catch bookings racing this check.
+    during = db.func.tsrange(start_time, start_time + timedelta(minutes=duration))
+    conflicts = []
+    for name, key, id in (('venue', Show.venue_id, venue_id), ('artist', Show.artist_id, artist_id)):
+        if db.session.query(db.exists().where(key == id).where(Show.during.op('&&')(during))).scalar():
+            conflicts.append(name)
+
+    return conflicts
+
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d')
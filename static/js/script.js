@@ -1,4 +1,49 @@
 window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
-};
\ No newline at end of file
+};
+// Fill the search box suggestions from the typeahead endpoints
+document.querySelectorAll('input[data-typeahead]').forEach(function (input) {
+  var list = document.getElementById(input.getAttribute('list'));
+  input.addEventListener('input', function () {
+    var term = input.value;
+    if (!term) {
+      list.innerHTML = '';
+      return;
+    }
+    fetch(input.dataset.typeahead + '?q=' + encodeURIComponent(term))
+      .then(function (response) { return response.json(); })
+      .then(function (response) {
+        if (input.value !== term) return;
+        list.innerHTML = '';
+        response.data.forEach(function (item) {
+          var option = document.createElement('option');
+          option.value = item.name;
+          list.appendChild(option);
+        });
+      });
+  });
+});
+// Fill the selects of the new show form from the choices endpoints
+document.querySelectorAll('input[data-remote-select]').forEach(function (input) {
+  var select = document.getElementById(input.dataset.target);
+  var load = function () {
+    var term = input.value;
+    fetch(input.dataset.remoteSelect + '?q=' + encodeURIComponent(term))
+      .then(function (response) { return response.json(); })
+      .then(function (response) {
+        if (input.value !== term) return;
+        var selected = select.value;
+        select.innerHTML = '';
+        response.results.forEach(function (item) {
+          var option = document.createElement('option');
+          option.value = item.id;
+          option.textContent = item.text;
+          option.selected = String(item.id) === selected;
+          select.appendChild(option);
+        });
+      });
+  };
+  input.addEventListener('input', load);
+  if (!select.value) load();
+});
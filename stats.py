@@ -0,0 +1,179 @@
+import threading
+import time
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy.dialects.postgresql import array, insert
+
+from jobs import task
+from models import db, Venue, Artist, Show, VenueStats, ArtistStats, GenreStats
+from versions import bump_versions
+
+cli = AppGroup('stats', help='Maintain the venue and artist show counts and the genre counts.')
+
+# model -> (stats model, Show column pointing at the model, page key prefix)
+STATS = {
+    Venue : (VenueStats, Show.venue_id, 'venue'),
+    Artist: (ArtistStats, Show.artist_id, 'artist'),
+}
+COLUMNS = ['id', 'upcoming_shows_count', 'past_shows_count', 'next_show_time', 'last_show_time', 'refreshed_at']
+GENRE_COLUMNS = ['genre', 'venues_count', 'artists_count', 'refreshed_at']
+
+
+# ----------------------------------------------------------------------------#
+# Maintenance.
+# ----------------------------------------------------------------------------#
+def refresh_stats(model, ids=None, now=None):
+    # Recount the shows of `ids` (a list or a subquery of ids, every row when
+    # None) in one INSERT ... SELECT ... ON CONFLICT, inside the current
+    # transaction. Pending shows are flushed first so they are counted.
+    stats, key, _ = STATS[model]
+    now = now or datetime.now()
+    upcoming = Show.start_time > now
+    db.session.flush()
+    query = db.session.query(
+        model.id,
+        db.func.count(Show.id).filter(upcoming),
+        db.func.count(Show.id).filter(~upcoming),
+        db.func.min(Show.start_time).filter(upcoming),
+        db.func.max(Show.start_time).filter(~upcoming),
+        db.literal(now, db.DateTime)
+    ).outerjoin(Show, key == model.id) \
+        .group_by(model.id)
+    if ids is not None:
+        query = query.filter(model.id.in_(ids))
+
+    statement = insert(stats).from_select(COLUMNS, query.statement)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[stats.id],
+        set_={column: statement.excluded[column] for column in COLUMNS[1:]}
+    ))
+
+
+@task('show_stats')
+def refresh_show_stats(venue_ids=(), artist_ids=()):
+    # After shows of these venues and artists were added or removed. The
+    # listings show the counts, so their versions are bumped too.
+    if venue_ids:
+        refresh_stats(Venue, sorted(set(venue_ids)))
+        bump_versions('Venue')
+    if artist_ids:
+        refresh_stats(Artist, sorted(set(artist_ids)))
+        bump_versions('Artist')
+
+
+@task('genre_stats')
+def refresh_genre_stats(genres=None, now=None):
+    # Recount the venues and artists listing `genres`, one GIN index lookup
+    # per genre, inside the current transaction. With None every genre is
+    # recounted from one pass over both tables. The listings show the counts,
+    # so their versions are bumped once the counts have changed.
+    now = now or datetime.now()
+    db.session.flush()
+    if genres is None:
+        listed = db.union_all(
+            db.select(db.func.unnest(Venue.genres).label('genre'), db.literal(1).label('venues'),
+                      db.literal(0).label('artists')),
+            db.select(db.func.unnest(Artist.genres), db.literal(0), db.literal(1))
+        ).subquery()
+        query = db.select(listed.c.genre, db.func.sum(listed.c.venues), db.func.sum(listed.c.artists),
+                          db.literal(now, db.DateTime)) \
+            .group_by(listed.c.genre)
+        db.session.execute(db.delete(GenreStats))
+        db.session.execute(insert(GenreStats).from_select(GENRE_COLUMNS, query))
+        bump_versions('Venue', 'Artist')
+        return
+    genres = sorted(set(genres))
+    if not genres:
+        return
+
+    statement = insert(GenreStats).from_select(GENRE_COLUMNS, genre_count_query(genres, now))
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[GenreStats.genre],
+        set_={column: statement.excluded[column] for column in GENRE_COLUMNS[1:]}
+    ))
+    bump_versions('Venue', 'Artist')
+
+
+def genre_count_query(genres, now):
+    # SELECT of the GENRE_COLUMNS of `genres`, one GIN index lookup per genre
+    # and table
+    names = db.values(db.column('genre', db.String), name='names').data([(genre,) for genre in genres])
+    return db.select(
+        names.c.genre,
+        db.select(db.func.count()).where(Venue.genres.op('@>')(array([names.c.genre]))).scalar_subquery(),
+        db.select(db.func.count()).where(Artist.genres.op('@>')(array([names.c.genre]))).scalar_subquery(),
+        db.literal(now, db.DateTime)
+    )
+
+
+def genre_counts(model):
+    # [(genre, count)] of the genres listed by at least one venue (or artist)
+    column = GenreStats.venues_count if model is Venue else GenreStats.artists_count
+    return db.session.query(GenreStats.genre, column).filter(column > 0).order_by(GenreStats.genre).all()
+
+
+def roll_over(now=None):
+    # Move shows that have started since the last refresh from upcoming to
+    # past: only rows whose next show is due are recounted. Their pages and
+    # the listings change, so their versions are bumped too. Returns the
+    # number of rows recounted.
+    now = now or datetime.now()
+    keys = []
+    count = 0
+    for model, (stats, _, prefix) in STATS.items():
+        ids = [id for id, in db.session.query(stats.id).filter(stats.next_show_time <= now)]
+        if ids:
+            refresh_stats(model, ids, now)
+            count += len(ids)
+            keys += [model.__tablename__] + ['%s:%d' % (prefix, id) for id in ids]
+    if keys:
+        bump_versions(*keys)
+    db.session.commit()
+
+    return count
+
+
+class RollOver(object):
+    # Runs roll_over before a request at most once per STATS_ROLLOVER_INTERVAL
+    # seconds in each worker, so counts stay current without a cron job
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.last = time.monotonic()
+
+    def __call__(self):
+        if time.monotonic() - self.last < self.interval or not self.lock.acquire(blocking=False):
+            return
+        try:
+            self.last = time.monotonic()
+            roll_over()
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception('stats roll over failed')
+        finally:
+            self.lock.release()
+
+
+def init_app(app):
+    if app.config['STATS_ROLLOVER_INTERVAL']:
+        app.before_request(RollOver(app.config['STATS_ROLLOVER_INTERVAL']))
+
+
+# ----------------------------------------------------------------------------#
+# Commands.
+# ----------------------------------------------------------------------------#
+@cli.command('rebuild', help='Recount the shows of every venue and artist, and every genre.')
+def rebuild():
+    for model in STATS:
+        refresh_stats(model)
+    refresh_genre_stats()
+    db.session.commit()
+
+
+@cli.command('roll-over', help='Move started shows from upcoming to past, e.g. from cron.')
+def roll_over_command():
+    click.echo('%d rows recounted' % roll_over())
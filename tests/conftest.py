@@ -0,0 +1,32 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from app import create_app  # noqa: E402
+from models import db  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    # The app on an empty PostgreSQL database given by TEST_DATABASE_URL,
+    # with the tables created from the models and dropped afterwards
+    url = os.environ.get('TEST_DATABASE_URL')
+    if not url:
+        pytest.skip('TEST_DATABASE_URL is not set')
+    settings = {key: getattr(config, key) for key in dir(config) if key.isupper()}
+    settings.update(SQLALCHEMY_DATABASE_URI=url, JOBS_WORKERS=0, STATS_ROLLOVER_INTERVAL=0)
+    app = create_app(SimpleNamespace(**settings))
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+            connection.execute(text('CREATE EXTENSION IF NOT EXISTS btree_gist'))
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.drop_all()
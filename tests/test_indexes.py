@@ -0,0 +1,72 @@
+import json
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+
+import geo
+import queries
+import stats
+from models import db
+
+# Each check runs the real query function, captures the statements it sends
+# and EXPLAINs them with sequential scans disabled, so the plans do not
+# depend on how much data is loaded. Only reads are run.
+CHECKS = [
+    ('venue page timeline', lambda: queries.show_timeline(venue_id=1), 'ix_Show_venue_id_start_time'),
+    ('artist page timeline', lambda: queries.show_timeline(artist_id=1), 'ix_Show_artist_id_start_time'),
+    ('/venues areas', lambda: queries.venue_areas(), 'ix_Venue_area_name_id'),
+    ('/artists', lambda: queries.artist_list(), 'ix_Artist_name_id'),
+    ('/shows', lambda: list(queries.show_feed()), 'ix_Show_start_time_id'),
+    ('/shows?venue_id=', lambda: list(queries.show_feed(venue_id=1)), 'ix_Show_venue_id_start_time'),
+    ('/shows?artist_id=', lambda: list(queries.show_feed(artist_id=1)), 'ix_Show_artist_id_start_time'),
+    ('genre counts', lambda: db.session.execute(stats.genre_count_query(['Jazz'], datetime.now())).all(),
+     'ix_Artist_genres'),
+    ('nearest venues', lambda: geo.GistNearby(db).nearby(40.71, -74.01), 'ix_Venue_location'),
+    ('venues within', lambda: geo.GistNearby(db).nearby(40.71, -74.01, radius_km=25), 'ix_Venue_location'),
+    ('venue recommendations', lambda: queries.recommended(venue_id=1), 'VenueMatch_pkey'),
+    ('artist recommendations', lambda: queries.recommended(artist_id=1), 'ArtistMatch_pkey'),
+]
+
+
+def plan_indexes(plan):
+    indexes = set()
+    if 'Index Name' in plan:
+        indexes.add(plan['Index Name'])
+    for child in plan.get('Plans', []):
+        indexes |= plan_indexes(child)
+    return indexes
+
+
+def used_indexes(run):
+    # Indexes in the plans of the statements `run` sends
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        run()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+
+    cursor = db.session.connection().connection.cursor()
+    cursor.execute('SET LOCAL enable_seqscan = off')
+    used = set()
+    try:
+        for statement, parameters in statements:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + statement, parameters)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            used |= plan_indexes(plan[0]['Plan'])
+    finally:
+        db.session.rollback()
+    return used
+
+
+@pytest.mark.parametrize('run, index', [check[1:] for check in CHECKS], ids=[check[0] for check in CHECKS])
+def test_query_uses_index(app, run, index):
+    with app.app_context():
+        assert index in used_indexes(run)
@@ -0,0 +1,246 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+from flask import Blueprint, current_app, render_template, request, flash, redirect, url_for, jsonify
+
+from genres import normalize_genre, normalize_genres
+from jobs import enqueue
+from matches import mark_stale
+from models import db, Venue, Show, VenueStats, ArtistMatch
+from pagination import decode_cursor
+from queries import venue_areas, venue_page, page_keys, stamp
+from stats import genre_counts
+from services import search, nearby, venue_index, page_cache
+from versions import bump_versions, conditional, current_versions
+
+bp = Blueprint('venues', __name__)
+
+
+#  Venues
+#  ----------------------------------------------------------------
+@bp.route('/venues')
+@conditional('Venue')
+def venues():
+    # one page at a time, moved through with the ?after= / ?before= cursors,
+    # of one genre with ?genre=
+    after = decode_cursor(request.args.get('after'), 4)
+    before = decode_cursor(request.args.get('before'), 4)
+    genre = normalize_genre(request.args.get('genre'))
+    return render_template('pages/venues.html',
+                           areas=lambda: venue_areas(after, before, current_app.config['VENUES_PAGE_SIZE'], genre),
+                           genres=lambda: genre_counts(Venue), genre=genre,
+                           versions=current_versions('Venue'))
+
+
+@bp.route('/venues/search', methods=['GET', 'POST'])
+def search_venues():
+    # search for Hop should return "The Musical Hop".
+    # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
+    search_term = request.values.get('search_term', '')
+    response = search.search(Venue, VenueStats, search_term,
+                             after=decode_cursor(request.args.get('after'), 3),
+                             before=decode_cursor(request.args.get('before'), 3),
+                             per_page=current_app.config['SEARCH_PAGE_SIZE'])
+
+    return render_template('pages/search_venues.html', results=response,
+                           search_term=search_term)
+
+
+@bp.route('/venues/typeahead')
+def typeahead_venues():
+    # JSON suggestions for the venue search box, answered from memory
+    return jsonify({
+        'data': venue_index.query(request.args.get('q', ''),
+                                  limit=min(request.args.get('limit', 10, type=int), 50))
+    })
+
+
+@bp.route('/venues/nearby')
+def nearby_venues():
+    # JSON: venues closest to ?lat=&lon=, within ?radius= km when given, each
+    # with its next upcoming shows
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lon', type=float)
+    radius = request.args.get('radius', type=float)
+    if latitude is None or longitude is None or not (-90 <= latitude <= 90 and -180 <= longitude <= 180) or \
+            (radius is not None and radius <= 0):
+        return jsonify({'error': 'lat and lon in degrees, and a positive radius in km, are required'}), 400
+
+    return jsonify({
+        'data': nearby.nearby(latitude, longitude, radius_km=radius,
+                              limit=max(1, min(request.args.get('limit', 20, type=int), 100)))
+    })
+
+
+@bp.route('/venues/<int:venue_id>', methods=['GET', 'POST'])
+@conditional('venue:{venue_id}', clock=True)
+def show_venue(venue_id):
+    # shows the venue page with the given venue_id
+    # keyed on the page version, so a bump from any process or job retires
+    # the entries of every worker. The data carries that version for the
+    # fragment cache of the template.
+    key = 'venue:%d' % venue_id
+    version = current_versions(key)[key]
+    data = page_cache.get_or_set('%s:%d' % (key, version), lambda: stamp(venue_page(venue_id), version))
+    if not data:
+        flash('An error occurred. Venue id:' + str(venue_id) + ' could not be found.', 'error')
+        return redirect(url_for('venues.venues'))
+
+    return render_template('pages/show_venue.html', venue=data)
+
+
+#  Create Venue
+#  ----------------------------------------------------------------
+@bp.route('/venues/create', methods=['GET'])
+def create_venue_form():
+    from forms import VenueForm
+
+    form = VenueForm()
+    return render_template('forms/new_venue.html', form=form)
+
+
+@bp.route('/venues/create', methods=['POST'])
+def create_venue_submission():
+    from forms import VenueForm
+
+    error = False
+    form = VenueForm()
+    try:
+        genres = normalize_genres(form.genres.data)
+        create_venue = Venue(
+            name=form.name.data,
+            city=form.city.data,
+            state=form.state.data,
+            address=form.address.data,
+            phone=form.phone.data,
+            genres=genres,
+            website=form.website.data,
+            facebook_link=form.facebook_link.data,
+            image_link=form.image_link.data,
+            seeking_talent=form.seeking_talent.data,
+            seeking_description=form.seeking_description.data
+        )
+        db.session.add(create_venue)
+        db.session.flush()
+        enqueue('genre_stats', genres=genres)
+        mark_stale(venue_ids=[create_venue.id])
+        bump_versions('Venue', 'VenueNames')
+        db.session.commit()
+        venue_index.add(create_venue.id, create_venue.name)
+    except:
+        error = True
+        db.session.rollback()
+    if error:
+        # on error, flash error message
+        flash('An error occurred. Venue ' + request.form['name'] + ' could not be listed.', 'error')
+        return render_template('forms/new_venue.html', form=form)
+    else:
+        # on successful db insert, flash success
+        flash('Venue ' + request.form['name'] + ' was successfully listed!', 'success')
+
+    return redirect(url_for('venues.venues'))
+
+
+#  Update
+#  ----------------------------------------------------------------
+@bp.route('/venues/<int:venue_id>/edit', methods=['GET'])
+def edit_venue(venue_id):
+    from forms import VenueForm
+
+    venue = Venue.query.get(venue_id)
+    form = VenueForm(obj=venue)
+    return render_template('forms/edit_venue.html', form=form, venue=venue)
+
+
+@bp.route('/venues/<int:venue_id>/edit', methods=['POST'])
+def edit_venue_submission(venue_id):
+    # venue record with ID <venue_id> using the new attributes
+    from forms import VenueForm
+
+    error = False
+    form = VenueForm()
+    try:
+        venue = Venue.query.get(venue_id)
+        genres = set(venue.genres or ())
+        name = venue.name
+        place = (venue.city, venue.state)
+        # assign new form values to database
+        venue.name = form.name.data
+        venue.city = form.city.data
+        venue.state = form.state.data
+        venue.address = form.address.data
+        venue.phone = form.phone.data
+        venue.genres = normalize_genres(form.genres.data)
+        venue.website = form.website.data
+        venue.facebook_link = form.facebook_link.data
+        venue.image_link = form.image_link.data
+        venue.seeking_talent = form.seeking_talent.data
+        venue.seeking_description = form.seeking_description.data
+        enqueue('genre_stats', genres=sorted(genres | set(venue.genres)))
+        if (venue.city, venue.state) != place:
+            # moved: "flask geo geocode" places it again
+            venue.latitude = venue.longitude = None
+        mark_stale(venue_ids=[venue_id])
+
+        # the pages of its artists follow in a job
+        keys = ['venue:%d' % venue_id]
+        if venue.name != name:
+            keys.append('VenueNames')
+        enqueue('linked_pages', venue_id=venue_id)
+        bump_versions('Venue', *keys)
+        # db.session.update(venue)
+        db.session.commit()
+        venue_index.add(venue_id, form.name.data)
+    except Exception as e:
+        print(f'Error ==> {e}')
+        error = True
+        db.session.rollback()
+    if error:
+        # on error, flash error message
+        flash('An error occurred. Venue ' + request.form['name'] + ' could not be updated.', 'error')
+    else:
+        # on successful db insert, flash success
+        flash('Venue ' + request.form['name'] + ' was successfully updated!', 'success')
+
+    return redirect(url_for('venues.show_venue', venue_id=venue_id))
+
+
+@bp.route('/venues/<int:venue_id>', methods=['DELETE'])
+def delete_venue(venue_id):
+    error = False
+    response = True
+    body = []
+    try:
+        venue = Venue.query.get(venue_id)
+        body = {
+            "id"   : venue.id,
+            "name" : venue.name
+        }
+        # collect the pages listing this venue, and its artists, before its
+        # shows cascade away
+        keys = page_keys(venue_id=venue_id)
+        artist_ids = [id for id, in db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()]
+        # and the artists it is recommended to, whose lists lose it
+        mark_stale(artist_ids=[id for id, in db.session.query(ArtistMatch.artist_id)
+                               .filter(ArtistMatch.venue_id == venue_id)])
+        db.session.delete(venue)
+        db.session.flush()
+        # the counts of its artists and genres follow in jobs
+        enqueue('show_stats', artist_ids=artist_ids)
+        enqueue('genre_stats', genres=sorted(venue.genres or ()))
+        bump_versions('Venue', 'VenueNames', 'Show', *keys)
+        db.session.commit()
+        venue_index.remove(venue_id)
+    except:
+        db.session.rollback()
+    if error:
+        response = False
+        # on error, flash error message
+        flash('An error occurred. Venue id:' + str(venue_id) + ' could not be removed!', 'error')
+        body['error'] = error
+    else:
+        # on successful db delete, flash success
+        flash('Venue id:' + str(venue_id) + ' was successfully removed!', 'success')
+        body['response'] = response
+
+    return jsonify(body)
@@ -0,0 +1,91 @@
+import hashlib
+import time
+from datetime import datetime
+from functools import wraps
+
+from flask import Response, current_app, g, make_response, request, session
+from sqlalchemy.dialects.postgresql import insert
+
+from models import db, Version
+
+
+# ----------------------------------------------------------------------------#
+# Data versions.
+# ----------------------------------------------------------------------------#
+def bump_versions(*keys):
+    # Increment the Version rows of `keys` as part of the current transaction
+    now = datetime.utcnow()
+    upsert = insert(Version).values([{'key': key, 'version': 1, 'updated_at': now} for key in set(keys)])
+    db.session.execute(upsert.on_conflict_do_update(
+        index_elements=[Version.key],
+        set_={'version': Version.version + 1, 'updated_at': upsert.excluded.updated_at}
+    ))
+
+
+def load_versions(*keys):
+    # Map each key to (version, updated_at), (0, None) for data that has never
+    # been written. Rows are read once per request.
+    known = g.setdefault('versions', {})
+    missing = [key for key in keys if key not in known]
+    if missing:
+        known.update((key, (0, None)) for key in missing)
+        rows = db.session.query(Version.key, Version.version, Version.updated_at) \
+            .filter(Version.key.in_(missing))
+        known.update((key, (version, updated_at)) for key, version, updated_at in rows)
+
+    return {key: known[key] for key in keys}
+
+
+def current_versions(*keys):
+    return {key: version for key, (version, _) in load_versions(*keys).items()}
+
+
+# ----------------------------------------------------------------------------#
+# Conditional requests.
+# ----------------------------------------------------------------------------#
+def conditional(*keys, clock=False):
+    # Answer If-None-Match / If-Modified-Since with a 304 before the view runs.
+    #
+    # The ETag and Last-Modified come from the Version rows of `keys`, which
+    # may use the route arguments ('venue:{venue_id}'). Pages that move shows
+    # from upcoming to past as time goes by pass clock=True, their stamps then
+    # also change every CONDITIONAL_CLOCK_INTERVAL seconds.
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                # pending flash messages make the page one-off
+                return view(**kwargs)
+
+            stamps = load_versions(*[key.format(**kwargs) for key in keys])
+            tag = repr(sorted((key, version) for key, (version, _) in stamps.items()))
+            modified = [updated_at for _, updated_at in stamps.values() if updated_at]
+            if clock:
+                interval = current_app.config['CONDITIONAL_CLOCK_INTERVAL']
+                tick = int(time.time() // interval) * interval
+                tag += ':%d' % tick
+                modified.append(datetime.utcfromtimestamp(tick))
+            etag = hashlib.sha1(tag.encode()).hexdigest()
+            last_modified = max(modified).replace(microsecond=0) if modified else None
+
+            if not_modified(etag, last_modified):
+                response = Response(status=304)
+            else:
+                response = make_response(view(**kwargs))
+            response.set_etag(etag)
+            if last_modified:
+                response.last_modified = last_modified
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
+
+def not_modified(etag, last_modified):
+    # If-None-Match wins over If-Modified-Since when both are sent
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    since = request.if_modified_since
+    if since and last_modified:
+        return last_modified <= since.replace(tzinfo=None)
+    return False